@@ -0,0 +1,116 @@
+# customer/events.py
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Dotted path of the broker class. LocalBroker only reaches clients connected
+# to this process; a multi-process deployment plugs in a shared one (Redis
+# pub/sub, Postgres LISTEN/NOTIFY) with the same publish/subscribe methods.
+DEFAULT_EVENT_BROKER = 'customer.events.LocalBroker'
+
+# Events buffered per connection; a client that falls this far behind misses events
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Every customer gets new-product events; order updates go to the buyer only
+PRODUCTS_CHANNEL = 'products'
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """Events published on some channels, read by one connection on its own event loop."""
+
+    def __init__(self, broker, channels, loop):
+        self.broker = broker
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Runs on self.loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping event for a slow subscriber")
+
+    async def get(self, timeout=None):
+        """Next event, or None once `timeout` seconds pass without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process pub/sub: publish() may be called from any thread, subscribers wait on asyncio queues."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, tuple(channels), asyncio.get_running_loop())
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The connection's loop has shut down
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'EVENT_BROKER', DEFAULT_EVENT_BROKER))()
+        return _broker
+
+
+def publish(channel, event_type, data=None):
+    """
+    Push an event to the clients listening on `channel` once the current
+    transaction commits, so they never see a change that was rolled back.
+    """
+    event = {'type': event_type, 'data': json.dumps(data or {})}
+
+    def send():
+        try:
+            get_broker().publish(channel, event)
+        except Exception:
+            logger.exception(f"Could not publish {event_type} on {channel}")
+
+    transaction.on_commit(send)
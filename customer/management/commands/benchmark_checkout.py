@@ -0,0 +1,67 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from customer.models import PaymentOrder
+from customer.payments import FakeGateway, aget_payment_order, checkout_key, get_payment_order
+
+CART = [{"id": 1, "quantity": 1, "price": 499.0}]
+AMOUNT = 49900
+
+
+def buyers(prefix, count):
+    return [f"benchmark:{prefix}:{n}" for n in range(count)]
+
+
+class Command(BaseCommand):
+    help = 'Compare checkout gateway-order throughput of sync workers and the async path against a slow fake gateway'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Checkouts per run')
+        parser.add_argument('--latency', type=float, default=0.2, help='Simulated gateway latency in seconds')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Sync worker threads, like the threads of a WSGI server')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Checkouts in flight at once on the async path')
+
+    def handle(self, *args, **options):
+        count, latency = options['requests'], options['latency']
+        gateway = FakeGateway(latency=latency)
+        self.stdout.write(f"{count} checkouts, gateway latency {latency * 1000:.0f} ms")
+
+        try:
+            elapsed = self.run_sync(gateway, buyers('sync', count), options['workers'])
+            self.report(f"sync, {options['workers']} workers", count, elapsed)
+            elapsed = asyncio.run(self.run_async(gateway, buyers('async', count), options['concurrency']))
+            self.report(f"async, {options['concurrency']} in flight", count, elapsed)
+        finally:
+            keys = [checkout_key(buyer, CART, AMOUNT) for buyer in buyers('sync', count) + buyers('async', count)]
+            PaymentOrder.objects.filter(idempotency_key__in=keys).delete()
+
+    def run_sync(self, gateway, buyer_ids, workers):
+        def checkout(buyer):
+            try:
+                return get_payment_order(buyer, CART, AMOUNT, gateway=gateway)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(checkout, buyer_ids))
+        return time.perf_counter() - start
+
+    async def run_async(self, gateway, buyer_ids, concurrency):
+        limit = asyncio.Semaphore(concurrency)
+
+        async def checkout(buyer):
+            async with limit:
+                return await aget_payment_order(buyer, CART, AMOUNT, gateway=gateway)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(checkout(buyer) for buyer in buyer_ids))
+        return time.perf_counter() - start
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f"  {label}: {elapsed:.2f}s, {count / elapsed:.1f} checkouts/s")
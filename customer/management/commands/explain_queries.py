@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from customer.models import CustomerOrder, OrderStatusHistory
+
+
+def hot_queries():
+    """(label, queryset, index the plan must use) for the order list queries."""
+    order = CustomerOrder.objects.order_by('-order_date', '-pk').first()
+    user_id = order.user_id if order else 0
+    order_pk = order.pk if order else 0
+    return [
+        ("customer order history",
+         CustomerOrder.objects.filter(user_id=user_id).order_by('-order_date'),
+         'order_user_date_idx'),
+        ("customer orders page (owner)",
+         CustomerOrder.objects.filter(user_id=user_id).order_by('-order_date', '-pk')[:11],
+         'order_user_date_idx'),
+        ("orders page by status (owner)",
+         CustomerOrder.objects.filter(status='pending').order_by('-order_date', '-pk')[:11],
+         'order_status_date_idx'),
+        ("all orders page (owner)",
+         CustomerOrder.objects.order_by('-order_date', '-pk')[:11],
+         'order_date_idx'),
+        ("order status timeline",
+         OrderStatusHistory.objects.filter(order_id=order_pk).order_by('changed_at'),
+         'status_history_order_idx'),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot order queries and check that they use their indexes'
+
+    def handle(self, *args, **options):
+        failures = []
+        for label, queryset, index in hot_queries():
+            plan = queryset.explain()
+            used = index in plan
+            if not used:
+                failures.append(label)
+            status = self.style.SUCCESS('OK') if used else self.style.ERROR('NO INDEX')
+            self.stdout.write(f"{status}  {label}: expects {index}")
+            if options['verbosity'] > 1 or not used:
+                self.stdout.write(f"    {plan}")
+
+        # order_id/username icontains searches ('%q%') cannot use a B-tree index
+        if failures:
+            raise CommandError(f"{len(failures)} queries do not use their index: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All hot queries use their indexes"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from owner.export import (
+    CATEGORY_HEADER, SUBCATEGORY_HEADER, category_rows, subcategory_rows, csv_chunks,
+)
+
+
+class Command(BaseCommand):
+    help = 'Stream the categories or an owner\'s subcategories as CSV, like the owner export buttons'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['categories', 'subcategories'])
+        parser.add_argument('--owner', help='Owner email (required for subcategories)')
+        parser.add_argument('--output', '-o', help='File to write instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['kind'] == 'categories':
+            chunks = csv_chunks(CATEGORY_HEADER, category_rows())
+        else:
+            if not options['owner']:
+                raise CommandError('--owner is required for subcategories')
+            chunks = csv_chunks(SUBCATEGORY_HEADER, subcategory_rows(options['owner']))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['kind']} to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,58 @@
+import os
+
+from django.core.management.base import BaseCommand
+from owner.media import RELEASE_GRACE_SECONDS, iter_orphans, prune_empty_dirs, referenced_media
+
+
+class Command(BaseCommand):
+    help = 'Find media files nothing references (data.json or the DB) and optionally delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete orphans (default is a dry run that only reports them)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report orphans, even with --delete')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Files deleted between progress reports')
+        parser.add_argument('--min-age', type=int, default=RELEASE_GRACE_SECONDS,
+                            help='Ignore files modified in the last N seconds')
+
+    def handle(self, *args, **options):
+        referenced = referenced_media()
+        self.stdout.write(f"{len(referenced)} referenced media files")
+
+        delete = options['delete'] and not options['dry_run']
+        batch = []
+        count = size = deleted = 0
+        for name, path, file_size in iter_orphans(referenced, min_age=options['min_age']):
+            count += 1
+            size += file_size
+            if options['verbosity'] > 1 or (not delete and options['verbosity'] > 0 and count <= 20):
+                self.stdout.write(f"  {name}")
+            if delete:
+                batch.append(path)
+                if len(batch) >= options['batch_size']:
+                    deleted += self._delete(batch)
+                    self.stdout.write(f"Deleted {deleted} files so far")
+                    batch = []
+        if delete:
+            deleted += self._delete(batch)
+            dirs = prune_empty_dirs()
+            self.stdout.write(self.style.SUCCESS(
+                f"Deleted {deleted} of {count} orphaned files ({size / 1024 / 1024:.1f} MB), "
+                f"removed {dirs} empty directories"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{count} orphaned files ({size / 1024 / 1024:.1f} MB); run with --delete to remove them"
+            ))
+
+    def _delete(self, paths):
+        deleted = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                deleted += 1
+            except OSError as e:
+                self.stderr.write(f"Could not delete {path}: {e}")
+        return deleted
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from owner.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued CSV import jobs, e.g. ones left behind when a web process restarted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new jobs instead of exiting')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Ran {count} import jobs"))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
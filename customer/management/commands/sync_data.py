@@ -1,48 +1,25 @@
 from django.core.management.base import BaseCommand
-from owner.models import Category, SubCategory, Product
-from pathlib import Path
-import json
+from owner.catalog import assign_product_ids, load_catalog
+from owner.sync import sync_catalog, BATCH_SIZE
 
 class Command(BaseCommand):
     help = 'Sync data from data.json to database'
-    
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Rows per bulk insert/update query')
+        parser.add_argument('--owner', action='append', dest='owners',
+                            help='Only sync this owner email (repeatable)')
+
     def handle(self, *args, **options):
-        data_file = Path(__file__).resolve().parent.parent.parent / "owner" / "data.json"
-        
-        if data_file.exists():
-            with open(data_file, "r") as f:
-                data = json.load(f)
-            
-            for email, user_data in data.get('user_data', {}).items():
-                # Sync categories
-                for cat_name in user_data.get('categories', []):
-                    category, created = Category.objects.get_or_create(
-                        name=cat_name,
-                        defaults={'description': f'Category for {cat_name}'}
-                    )
-                
-                # Sync subcategories and products
-                for cat_name, products in user_data.get('subcategories', {}).items():
-                    try:
-                        category = Category.objects.get(name=cat_name)
-                        
-                        for product_data in products:
-                            subcategory, created = SubCategory.objects.get_or_create(
-                                category=category,
-                                name=product_data.get('subcategory', 'Unknown'),
-                                defaults={'image': product_data.get('image', '').replace('/media/', '')}
-                            )
-                            
-                            Product.objects.get_or_create(
-                                name=product_data['name'],
-                                defaults={
-                                    'price': product_data['price'],
-                                    'image': product_data.get('image', '').replace('/media/', ''),
-                                    'subcategory': subcategory,
-                                    'description': product_data.get('description', '')
-                                }
-                            )
-                    except Category.DoesNotExist:
-                        print(f"Category {cat_name} not found in database")
-        
-        self.stdout.write(self.style.SUCCESS('Data synced successfully'))
\ No newline at end of file
+        # Idempotent: owners, categories, subcategories and products are
+        # upserted in bulk batches, so the command can be re-run at any time.
+        # Older data.json files have no product ids yet
+        assign_product_ids()
+        data = load_catalog()
+        stats = sync_catalog(data, emails=options['owners'], batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Data synced successfully: {stats['owners']} owners, {stats['created']} products created, "
+            f"{stats['updated']} updated, {stats['deleted']} deleted"
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0005_product_quantity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerorder',
+            index=models.Index(fields=['user', '-order_date', '-id'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerorder',
+            index=models.Index(fields=['status', '-order_date', '-id'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerorder',
+            index=models.Index(fields=['-order_date', '-id'], name='order_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatushistory',
+            index=models.Index(fields=['order', 'changed_at'], name='status_history_order_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+def release_paid_keys(apps, schema_editor):
+    PaymentOrder = apps.get_model('customer', 'PaymentOrder')
+    PaymentOrder.objects.filter(paid_at__isnull=False).update(idempotency_key=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0009_paymentorder'),
+    ]
+
+    operations = [
+        # MySQL has no partial indexes and silently skips conditional constraints
+        migrations.RemoveConstraint(
+            model_name='paymentorder',
+            name='payment_order_open_key_unique',
+        ),
+        migrations.AlterField(
+            model_name='paymentorder',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(release_paid_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='paymentorder',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -5,6 +5,9 @@ from django.utils import timezone
 import uuid, os
 from django.core.exceptions import ValidationError
 from django.contrib.auth.hashers import make_password, check_password
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from .events import PRODUCTS_CHANNEL, publish
 
 
 def user_profile_pic_path(instance, filename):
@@ -24,11 +27,64 @@ class NewProductNotification(models.Model):
     
     class Meta:
         ordering = ['-added_date']
+
+
+class UserNotification(models.Model):
+    """A new-product notification delivered to one user, written in bulk by the fan-out task."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    notification = models.ForeignKey(NewProductNotification, on_delete=models.CASCADE, related_name='deliveries')
+    sms_sent = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'user'], name='user_notification_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification} -> {self.user.username}"
+
+
+class NotificationCounter(models.Model):
+    """
+    A user's unread count of active new-product notifications, kept up to
+    date by the receivers at the end of this module. unread_count is None
+    when it must be recounted; version changes whenever the unread set may
+    have.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread_count = models.PositiveIntegerField(null=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count} unread"
+
+    @classmethod
+    def notification_added(cls):
+        """A new active notification is unread for everyone: one UPDATE over all counters."""
+        cls.objects.update(unread_count=models.F('unread_count') + 1, version=models.F('version') + 1)
+
+    @classmethod
+    def notification_read(cls, user_ids):
+        """Users in `user_ids` have just read one more active notification."""
+        cls.objects.filter(user_id__in=user_ids, unread_count__gt=0).update(
+            unread_count=models.F('unread_count') - 1, version=models.F('version') + 1
+        )
+
+    @classmethod
+    def invalidate(cls, user_ids=None):
+        """Make the counters of `user_ids` (everyone by default) recount on their next poll."""
+        counters = cls.objects.all()
+        if user_ids is not None:
+            counters = counters.filter(user_id__in=user_ids)
+        counters.update(unread_count=None, version=models.F('version') + 1)
+
 class CustomerProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     profile_picture = models.ImageField(upload_to=user_profile_pic_path, blank=True, null=True)
     phone_number = models.CharField(max_length=15, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
+    receive_sms_notifications = models.BooleanField(default=True)
     
     # Additional fields for name and password storage
     first_name = models.CharField(max_length=30, blank=True)
@@ -128,6 +184,13 @@ class CustomerOrder(models.Model):
     order_date = models.DateTimeField(auto_now_add=True)
     payment_status = models.CharField(max_length=20, default="Completed")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-order_date', '-id'], name='order_user_date_idx'),
+            models.Index(fields=['status', '-order_date', '-id'], name='order_status_date_idx'),
+            models.Index(fields=['-order_date', '-id'], name='order_date_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.order_id} - {self.user.username} - {self.status}"
 
@@ -140,5 +203,61 @@ class OrderStatusHistory(models.Model):
     status = models.CharField(max_length=20, choices=CustomerOrder.STATUS_CHOICES)
     changed_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'changed_at'], name='status_history_order_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.order.order_id} - {self.status} at {self.changed_at}"
\ No newline at end of file
+        return f"{self.order.order_id} - {self.status} at {self.changed_at}"
+
+
+class PaymentOrder(models.Model):
+    """
+    A payment gateway order made for one checkout. It is reused while the
+    buyer, cart and amount stay the same, until it is paid or goes stale.
+    """
+    # At most one open order per checkout. Paying clears the key, so paid
+    # orders stay as history and the next checkout of the same cart can
+    # open a new one; every database allows repeated NULLs in a unique column
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    gateway_order_id = models.CharField(max_length=100, unique=True)
+    amount = models.PositiveIntegerField()  # in paise
+    currency = models.CharField(max_length=3, default='INR')
+    created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.gateway_order_id} ({self.amount} {self.currency})"
+
+# ---------- Unread notification counters ----------
+# Connected here rather than in customer/signals.py so they are registered
+# whenever the models are loaded
+@receiver(post_save, sender=NewProductNotification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        NotificationCounter.notification_added()
+        from .notifications import new_product_event
+        publish(PRODUCTS_CHANNEL, 'new_product', new_product_event(instance))
+    elif not created:
+        # is_active or the product may have changed; rare, so just recount
+        NotificationCounter.invalidate()
+
+
+@receiver(post_delete, sender=NewProductNotification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    NotificationCounter.invalidate()
+
+
+@receiver(m2m_changed, sender=NewProductNotification.notified_users.through)
+def count_read_notifications(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        NotificationCounter.invalidate([instance.pk])
+    elif action == 'post_add':
+        # pk_set only holds the users that had not read it yet
+        if instance.is_active and pk_set:
+            NotificationCounter.notification_read(pk_set)
+    else:
+        NotificationCounter.invalidate(pk_set)
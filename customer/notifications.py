@@ -0,0 +1,157 @@
+# customer/notifications.py
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from owner.catalog import get_catalog
+from owner.thumbnails import thumbnail_url
+
+from .models import CustomerProfile, NewProductNotification, NotificationCounter, UserNotification
+from .sms_utils import RateLimiter, get_sms_backend, send_sms
+
+logger = logging.getLogger(__name__)
+
+# Profiles read, notification rows written and SMS sent per batch
+FANOUT_BATCH_SIZE = 1000
+
+# Concurrent SMS requests, and the provider's messages-per-second limit
+SMS_CONCURRENCY = getattr(settings, 'SMS_CONCURRENCY', 8)
+SMS_RATE_LIMIT = getattr(settings, 'SMS_RATE_LIMIT', 50)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def new_product_message(notification):
+    product = get_catalog().get(notification.product_name)
+    if product:
+        return f"🚀 New at TaskPro: {notification.product_name} for ₹{product['price']}. Shop now!"
+    return f"🚀 New at TaskPro: {notification.product_name}. Shop now!"
+
+
+def fan_out_new_product(notification_id, batch_size=FANOUT_BATCH_SIZE, backend=None,
+                        concurrency=SMS_CONCURRENCY, rate_limit=SMS_RATE_LIMIT):
+    """
+    Deliver a new-product notification to every customer who wants SMS.
+    Profiles are streamed in batches; each batch costs one query for users
+    already texted, one bulk insert of UserNotification rows (existing rows
+    are left alone) and one update for the SMS that went out, while the SMS
+    themselves are sent `concurrency` at a time under a shared rate limit.
+    A row is only marked sent once its SMS was accepted, so re-running after
+    a failure retries the users who missed out and texts nobody twice.
+    Returns the number of SMS sent.
+    """
+    notification = NewProductNotification.objects.get(id=notification_id)
+    message = new_product_message(notification)
+    backend = backend or get_sms_backend()
+    limiter = RateLimiter(rate_limit)
+
+    def deliver(recipient):
+        user_id, phone_number = recipient
+        limiter.acquire()
+        return user_id, send_sms(phone_number, message, backend)
+
+    recipients = (
+        CustomerProfile.objects
+        .filter(receive_sms_notifications=True)
+        .exclude(phone_number__isnull=True)
+        .exclude(phone_number='')
+        .order_by('pk')
+        .values_list('user_id', 'phone_number')
+    )
+    sent_count = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='sms') as pool:
+        for batch in _batches(recipients.iterator(chunk_size=batch_size), batch_size):
+            texted = set(
+                UserNotification.objects
+                .filter(notification=notification, sms_sent=True, user_id__in=[user_id for user_id, _ in batch])
+                .values_list('user_id', flat=True)
+            )
+            batch = [recipient for recipient in batch if recipient[0] not in texted]
+            if not batch:
+                continue
+            UserNotification.objects.bulk_create(
+                [UserNotification(user_id=user_id, notification=notification) for user_id, _ in batch],
+                ignore_conflicts=True,
+            )
+            sent = [user_id for user_id, ok in pool.map(deliver, batch) if ok]
+            UserNotification.objects.filter(notification=notification, user_id__in=sent).update(sms_sent=True)
+            sent_count += len(sent)
+
+    logger.info(f"New product '{notification.product_name}': SMS sent to {sent_count} users")
+    return sent_count
+
+
+# ---------- Unread counters ----------
+# Dropdown payloads are cached per counter version, so a poll with nothing
+# new costs one primary-key lookup
+NOTIFICATION_PREVIEW_SIZE = 5
+NOTIFICATION_PREVIEW_TIMEOUT = 60 * 60
+
+
+def unread_notifications(user):
+    return NewProductNotification.objects.filter(is_active=True).exclude(notified_users=user)
+
+
+def unread_state(user):
+    """(unread count, counter version) for a user, recounting only when the counter was invalidated."""
+    counter = NotificationCounter.objects.filter(user=user).values_list('unread_count', 'version').first()
+    if counter and counter[0] is not None:
+        return counter
+    if counter is None:
+        NotificationCounter.objects.get_or_create(user=user)
+        version = 0
+    else:
+        version = counter[1]
+    count = unread_notifications(user).count()
+    # Only store the count if nothing changed the unread set meanwhile
+    NotificationCounter.objects.filter(user=user, version=version, unread_count__isnull=True).update(unread_count=count)
+    return count, version
+
+
+def notification_preview(user):
+    """The JSON payload of the header dropdown: the unread count and the newest unread notifications."""
+    count, version = unread_state(user)
+    if not count:
+        return {'count': 0, 'notifications': []}
+
+    catalog = get_catalog()
+    key = f"customer:notifications:{user.pk}:{version}:{catalog.revision}"
+    payload = cache.get(key)
+    if payload is None:
+        notifications = []
+        for notification in unread_notifications(user)[:NOTIFICATION_PREVIEW_SIZE]:
+            product = catalog.get(notification.product_name)
+            if product:
+                notifications.append(notification_item(notification, product))
+        payload = {'count': count, 'notifications': notifications}
+        cache.set(key, payload, NOTIFICATION_PREVIEW_TIMEOUT)
+    return payload
+
+
+def notification_item(notification, product=None):
+    """One dropdown entry; image and link are left out when the product is not in the catalog."""
+    item = {
+        'id': notification.id,
+        'product_name': notification.product_name,
+        'added_date': notification.added_date.strftime('%Y-%m-%d %H:%M'),
+    }
+    if product:
+        item['image_path'] = thumbnail_url(product.get('image_path', '/media/products/default.png'), 200)
+        item['product_url'] = reverse('product_detail', args=[product['id']])
+    return item
+
+
+def new_product_event(notification):
+    """Payload of the `new_product` event: the dropdown entry, so clients need not refetch."""
+    return notification_item(notification, get_catalog().get(notification.product_name))
@@ -0,0 +1,218 @@
+# customer/payments.py
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+import weakref
+from datetime import timedelta
+
+import razorpay
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import PaymentOrder
+
+try:
+    import httpx
+except ImportError:  # Optional: without it async checkout runs the sync client on a thread
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+# Dotted path of the gateway class; FakeGateway runs checkout without the network
+DEFAULT_PAYMENT_GATEWAY = 'customer.payments.RazorpayGateway'
+
+# Connections kept open to the gateway, and how long one call may take
+GATEWAY_POOL_SIZE = getattr(settings, 'PAYMENT_GATEWAY_POOL_SIZE', 10)
+GATEWAY_TIMEOUT = getattr(settings, 'PAYMENT_GATEWAY_TIMEOUT', 10)
+
+# Unpaid gateway orders older than this are replaced rather than reused
+PAYMENT_ORDER_TTL = timedelta(hours=6)
+
+
+class RazorpayGateway:
+    """
+    Razorpay client shared by the whole process, reusing pooled keep-alive
+    connections. acreate_order() makes the same call with httpx, so async
+    views await the network instead of holding a thread; where httpx is not
+    installed it runs create_order() in a worker thread instead.
+    """
+    ORDERS_URL = 'https://api.razorpay.com/v1/orders'
+
+    def __init__(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GATEWAY_POOL_SIZE)
+        session.mount('https://', adapter)
+        self.auth = (settings.RAZORPAY_KEY_ID, settings.RAZORPAY_SECRET_KEY)
+        self.client = razorpay.Client(session=session, auth=self.auth)
+        # An httpx client is bound to the event loop it was created on:
+        # loop -> (client, generator that closes it when the loop shuts down)
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def create_order(self, amount, currency, receipt):
+        return self.client.order.create(self._order_data(amount, currency, receipt), timeout=GATEWAY_TIMEOUT)
+
+    async def acreate_order(self, amount, currency, receipt):
+        if httpx is None:
+            return await sync_to_async(self.create_order, thread_sensitive=False)(amount, currency, receipt)
+        client = await self._async_client()
+        response = await client.post(self.ORDERS_URL, json=self._order_data(amount, currency, receipt))
+        if response.status_code >= 400:
+            try:
+                description = response.json()["error"]["description"]
+            except (ValueError, KeyError, TypeError):
+                description = f"HTTP {response.status_code}"
+            error = razorpay.errors.ServerError if response.status_code >= 500 else razorpay.errors.BadRequestError
+            raise error(description)
+        return response.json()
+
+    def _order_data(self, amount, currency, receipt):
+        return {
+            "amount": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "payment_capture": 1
+        }
+
+    async def _async_client(self):
+        """The httpx client for the running loop, closed when that loop shuts down."""
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(
+                auth=self.auth,
+                timeout=GATEWAY_TIMEOUT,
+                limits=httpx.Limits(max_connections=GATEWAY_POOL_SIZE, max_keepalive_connections=GATEWAY_POOL_SIZE),
+            )
+            # asyncio.run() and async_to_sync finalise pending async generators
+            # before closing their loop, which runs this one's cleanup
+            closer = _close_on_shutdown(client)
+            await closer.__anext__()
+            entry = self._async_clients[loop] = (client, closer)
+        return entry[0]
+
+
+async def _close_on_shutdown(client):
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+class FakeGateway:
+    """
+    In-memory stand-in for the gateway, for tests and offline development.
+    `latency` seconds are spent on every call, to simulate a slow gateway.
+    """
+
+    def __init__(self, latency=None):
+        self.latency = getattr(settings, 'FAKE_GATEWAY_LATENCY', 0) if latency is None else latency
+        self.orders = {}
+        self._lock = threading.Lock()
+
+    def create_order(self, amount, currency, receipt):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._new_order(amount, currency, receipt)
+
+    async def acreate_order(self, amount, currency, receipt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._new_order(amount, currency, receipt)
+
+    def _new_order(self, amount, currency, receipt):
+        order = {
+            "id": f"order_fake{uuid.uuid4().hex[:14]}",
+            "amount": amount,
+            "currency": currency,
+            "receipt": receipt,
+            "status": "created",
+        }
+        with self._lock:
+            self.orders[order["id"]] = order
+        return order
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_payment_gateway():
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = import_string(getattr(settings, 'PAYMENT_GATEWAY', DEFAULT_PAYMENT_GATEWAY))()
+        return _gateway
+
+
+def checkout_key(buyer, cart_products, amount, currency='INR'):
+    """Idempotency key of a checkout: who is paying, for which items at which prices, and how much."""
+    items = sorted((p["id"], p["quantity"], p["price"]) for p in cart_products)
+    payload = json.dumps([buyer, items, amount, currency], separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _open_order_id(key):
+    """Gateway order id of the open order for a key, or None (dropping it if stale)."""
+    existing = PaymentOrder.objects.filter(idempotency_key=key).first()
+    if existing:
+        if existing.created_at >= timezone.now() - PAYMENT_ORDER_TTL:
+            return existing.gateway_order_id
+        existing.delete()
+    return None
+
+
+def _record_order(key, order, amount, currency):
+    """Save a new gateway order, returning the id of the order to use."""
+    try:
+        with transaction.atomic():
+            PaymentOrder.objects.create(
+                idempotency_key=key, gateway_order_id=order["id"], amount=amount, currency=currency
+            )
+    except IntegrityError:
+        # A concurrent request for the same checkout won; use its order
+        winner = PaymentOrder.objects.filter(idempotency_key=key).first()
+        if winner:
+            logger.info(f"Discarding duplicate gateway order {order['id']}")
+            return winner.gateway_order_id
+        raise
+    return order["id"]
+
+
+def get_payment_order(buyer, cart_products, amount, currency='INR', gateway=None):
+    """
+    Gateway order id for a checkout. Reloading the payment page, or
+    resubmitting the same coupon, reuses the open order for the same key
+    instead of creating a new one on the gateway.
+    """
+    key = checkout_key(buyer, cart_products, amount, currency)
+    order_id = _open_order_id(key)
+    if order_id:
+        return order_id
+    order = (gateway or get_payment_gateway()).create_order(amount, currency, receipt=key[:40])
+    return _record_order(key, order, amount, currency)
+
+
+async def aget_payment_order(buyer, cart_products, amount, currency='INR', gateway=None):
+    """get_payment_order() for async views: the gateway call is awaited, not run on a thread."""
+    key = checkout_key(buyer, cart_products, amount, currency)
+    order_id = await sync_to_async(_open_order_id)(key)
+    if order_id:
+        return order_id
+    order = await (gateway or get_payment_gateway()).acreate_order(amount, currency, receipt=key[:40])
+    return await sync_to_async(_record_order)(key, order, amount, currency)
+
+
+def mark_paid(gateway_order_id):
+    """Close a gateway order and release its key, so the next checkout of the same cart gets a new one."""
+    PaymentOrder.objects.filter(gateway_order_id=gateway_order_id, paid_at__isnull=True).update(
+        paid_at=timezone.now(), idempotency_key=None,
+    )
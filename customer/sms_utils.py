@@ -0,0 +1,74 @@
+# customer/sms_utils.py
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Dotted path of the SMS backend class, like EMAIL_BACKEND
+DEFAULT_SMS_BACKEND = 'customer.sms_utils.ConsoleSMSBackend'
+
+
+class BaseSMSBackend:
+    def send(self, phone_number, message):
+        """Send one message; return True if the provider accepted it."""
+        raise NotImplementedError
+
+
+class ConsoleSMSBackend(BaseSMSBackend):
+    """Logs messages instead of sending them; the default until a provider is configured."""
+
+    def send(self, phone_number, message):
+        logger.info(f"SMS to {phone_number}: {message}")
+        return True
+
+
+class LocMemSMSBackend(BaseSMSBackend):
+    """Keeps sent messages in LocMemSMSBackend.outbox, for tests and local runs."""
+    outbox = []
+    _lock = threading.Lock()
+
+    def send(self, phone_number, message):
+        with self._lock:
+            self.outbox.append((phone_number, message))
+        return True
+
+
+def get_sms_backend(path=None):
+    return import_string(path or getattr(settings, 'SMS_BACKEND', DEFAULT_SMS_BACKEND))()
+
+
+def send_sms(phone_number, message, backend=None):
+    """Send an SMS, logging instead of raising on failure."""
+    backend = backend or get_sms_backend()
+    try:
+        return bool(backend.send(phone_number, message))
+    except Exception:
+        logger.exception(f"Could not send SMS to {phone_number}")
+        return False
+
+
+class RateLimiter:
+    """Token bucket shared by threads: at most `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
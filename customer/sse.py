@@ -0,0 +1,119 @@
+# customer/sse.py
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.http.cookie import parse_cookie
+from django.utils.module_loading import import_string
+
+from .events import PRODUCTS_CHANNEL, get_broker, user_channel
+
+logger = logging.getLogger(__name__)
+
+# Path served by event_stream in taskpro/asgi.py, outside Django's URL routing
+EVENTS_PATH = '/events/'
+
+# A comment line this often keeps proxies from closing idle connections
+KEEPALIVE_SECONDS = 25
+
+# How long a browser waits before reconnecting after the stream drops
+RETRY_MILLISECONDS = 5000
+
+
+def _format(event_type, data):
+    return f"event: {event_type}\ndata: {data}\n\n".encode()
+
+
+def _authenticate(scope):
+    """
+    (user id, dropdown payload) for the session cookie of a request, or
+    (None, None). Stale connections are dropped around the queries, as
+    Django does around a request, since this runs outside the request cycle.
+    """
+    close_old_connections()
+    try:
+        return _session_user(scope)
+    finally:
+        close_old_connections()
+
+
+def _session_user(scope):
+    from .notifications import notification_preview
+
+    headers = dict(scope.get('headers') or [])
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None, None
+    session = import_string(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(SimpleNamespace(session=session))
+    if not user.is_authenticated:
+        return None, None
+    return user.pk, notification_preview(user)
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def event_stream(scope, receive, send):
+    """
+    ASGI app streaming server-sent events to a logged-in customer: the
+    current unread notifications on connect, then `new_product` and
+    `order_status` events as they are published. An idle connection is
+    one waiting coroutine and a queue; it runs no queries and no Django
+    request cycle.
+    """
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    user_id, preview = await sync_to_async(_authenticate)(scope)
+    if user_id is None:
+        await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Not authenticated'})
+        return
+
+    subscription = get_broker().subscribe([PRODUCTS_CHANNEL, user_channel(user_id)])
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Stop nginx from buffering the stream
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': f"retry: {RETRY_MILLISECONDS}\n\n".encode() + _format('notifications', json.dumps(preview)),
+            'more_body': True,
+        })
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(subscription.get(KEEPALIVE_SECONDS))
+            await asyncio.wait([next_event, disconnected], return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                next_event.cancel()
+                break
+            event = next_event.result()
+            body = _format(event['type'], event['data']) if event else b": keepalive\n\n"
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    except OSError:
+        # The client went away mid-write
+        pass
+    finally:
+        subscription.close()
+        disconnected.cancel()
+    logger.debug(f"Event stream for user {user_id} closed")
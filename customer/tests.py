@@ -1,3 +1,280 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from owner.catalog import get_catalog, invalidate_product_catalog
+from owner.models import CatalogRevision, Category, Owner, Product, SubCategory
+from .models import CustomerProfile, NewProductNotification, PaymentOrder, UserNotification
+from .notifications import fan_out_new_product
+from . import payments
+from .payments import FakeGateway, RazorpayGateway, mark_paid
+from .sms_utils import LocMemSMSBackend
+
+
+class AllNotificationsViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'pass-1234')
+        CustomerProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        self.owner = Owner.objects.create(email='owner@example.com')
+        self.category = Category.objects.create(name='Gadgets')
+        self.subcategory = SubCategory.objects.create(category=self.category, name='Phones')
+
+    def add_notifications(self, count):
+        start = NewProductNotification.objects.count()
+        names = [f"Product {start + i}" for i in range(count)]
+        Product.objects.bulk_create([
+            Product(name=name, price=10, owner=self.owner, category=self.category, subcategory=self.subcategory)
+            for name in names
+        ])
+        for name in names:
+            NewProductNotification.objects.create(product_name=name)
+        CatalogRevision.bump()
+        invalidate_product_catalog()
+
+    def visit(self):
+        get_catalog()
+        # Keep the warmed catalog, so its revision check doesn't add a query
+        with mock.patch('owner.catalog.REVISION_CHECK_INTERVAL', 3600), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all_notifications'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_notifications(self):
+        self.add_notifications(2)
+        _, few = self.visit()
+
+        self.add_notifications(30)
+        response, many = self.visit()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['notifications']), 32)
+        # Only the 30 new ones were unread before this visit
+        self.assertEqual(sum(not item['is_read'] for item in response.context['notifications']), 30)
+
+    def test_marks_every_notification_read(self):
+        self.add_notifications(5)
+        self.visit()
+
+        self.assertEqual(self.user.newproductnotification_set.count(), 5)
+        response = self.client.get(reverse('customer_notifications'))
+        self.assertEqual(response.json()['count'], 0)
+
+        # Nothing is left to insert on a second visit
+        _, repeat = self.visit()
+        self.add_notifications(1)
+        _, with_new = self.visit()
+        self.assertLess(repeat, with_new)
+
+
+class NewProductEventTests(TestCase):
+    def test_event_carries_the_dropdown_entry(self):
+        owner = Owner.objects.create(email='owner@example.com')
+        category = Category.objects.create(name='Gadgets')
+        subcategory = SubCategory.objects.create(category=category, name='Phones')
+        product = Product.objects.create(name="Phone", price=10, owner=owner, category=category,
+                                         subcategory=subcategory)
+        CatalogRevision.bump()
+        invalidate_product_catalog()
+
+        with mock.patch('customer.models.publish') as publish:
+            notification = NewProductNotification.objects.create(product_name="Phone")
+
+        channel, event_type, data = publish.call_args[0]
+        self.assertEqual((channel, event_type), ('products', 'new_product'))
+        self.assertEqual(data['id'], notification.id)
+        self.assertEqual(data['product_url'], reverse('product_detail', args=[product.id]))
+        self.assertIn('image_path', data)
+
+
+class FlakySMSBackend(LocMemSMSBackend):
+    """Rejects every message to the numbers in `failing`."""
+    failing = ()
+
+    def send(self, phone_number, message):
+        if phone_number in self.failing:
+            raise ConnectionError("provider unavailable")
+        return super().send(phone_number, message)
+
+
+class FanOutTests(TestCase):
+    def setUp(self):
+        LocMemSMSBackend.outbox.clear()
+        self.addCleanup(LocMemSMSBackend.outbox.clear)
+        self.users = []
+        for i in range(5):
+            user = User.objects.create_user(f'buyer{i}', f'buyer{i}@example.com', 'pass-1234')
+            CustomerProfile.objects.create(user=user, phone_number=f'+91900000000{i}')
+            self.users.append(user)
+        # Opted out, and no phone number: never texted
+        CustomerProfile.objects.create(user=User.objects.create_user('quiet'), phone_number='+919111111111',
+                                       receive_sms_notifications=False)
+        CustomerProfile.objects.create(user=User.objects.create_user('nophone'))
+        self.notification = NewProductNotification.objects.create(product_name="Phone")
+
+    def fan_out(self, backend):
+        return fan_out_new_product(self.notification.id, batch_size=2, backend=backend, concurrency=2,
+                                   rate_limit=1000)
+
+    def texted(self):
+        return sorted(phone for phone, _ in LocMemSMSBackend.outbox)
+
+    def test_texts_everyone_not_yet_texted(self):
+        UserNotification.objects.create(user=self.users[0], notification=self.notification, sms_sent=True)
+        # Left unsent by a run that stopped before its SMS went out
+        UserNotification.objects.create(user=self.users[1], notification=self.notification)
+
+        self.assertEqual(self.fan_out(LocMemSMSBackend()), 4)
+
+        self.assertEqual(self.texted(), [f'+91900000000{i}' for i in range(1, 5)])
+        deliveries = UserNotification.objects.filter(notification=self.notification)
+        self.assertEqual(deliveries.count(), 5)
+        self.assertFalse(deliveries.filter(sms_sent=False).exists())
+
+    def test_retry_sends_only_what_failed(self):
+        backend = FlakySMSBackend()
+        backend.failing = {'+919000000003'}
+        self.assertEqual(self.fan_out(backend), 4)
+        unsent = UserNotification.objects.filter(notification=self.notification, sms_sent=False)
+        self.assertEqual(list(unsent.values_list('user_id', flat=True)), [self.users[3].id])
+
+        self.assertEqual(self.fan_out(LocMemSMSBackend()), 1)
+        self.assertEqual(self.texted(), [f'+91900000000{i}' for i in range(5)])
+        self.assertFalse(unsent.exists())
+        self.assertEqual(self.fan_out(LocMemSMSBackend()), 0)
+
+
+class CheckoutPaymentTests(TestCase):
+    def setUp(self):
+        self.gateway = FakeGateway()
+        patcher = mock.patch('customer.payments.get_payment_gateway', return_value=self.gateway)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pass-1234')
+        CustomerProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        owner = Owner.objects.create(email='owner@example.com')
+        category = Category.objects.create(name='Gadgets')
+        subcategory = SubCategory.objects.create(category=category, name='Phones')
+        product = Product.objects.create(name='Phone', price=500, owner=owner, category=category, subcategory=subcategory)
+        CatalogRevision.bump()
+        invalidate_product_catalog()
+
+        session = self.client.session
+        session['cart'] = {str(product.id): 2}
+        session.save()
+
+    def order_id(self, response):
+        return response.context['razorpay_order_id']
+
+    def test_reload_reuses_gateway_order(self):
+        first = self.order_id(self.client.get(reverse('checkout_payment')))
+        second = self.order_id(self.client.get(reverse('checkout_payment')))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.gateway.orders), 1)
+        self.assertEqual(PaymentOrder.objects.count(), 1)
+
+    def test_coupon_and_payment_start_new_orders(self):
+        plain = self.order_id(self.client.get(reverse('checkout_payment')))
+        discounted = self.order_id(self.client.post(reverse('checkout_payment'), {'coupon_code': 'DISCOUNT20'}))
+        self.assertNotEqual(plain, discounted)
+        self.assertEqual(self.gateway.orders[discounted]['amount'], 80000)
+        # Resubmitting the same coupon is a reload
+        again = self.order_id(self.client.post(reverse('checkout_payment'), {'coupon_code': 'DISCOUNT20'}))
+        self.assertEqual(again, discounted)
+
+        mark_paid(discounted)
+        after_payment = self.order_id(self.client.post(reverse('checkout_payment'), {'coupon_code': 'DISCOUNT20'}))
+        self.assertNotEqual(after_payment, discounted)
+        self.assertEqual(len(self.gateway.orders), 3)
+
+    def test_same_cart_can_be_paid_again(self):
+        first = self.order_id(self.client.get(reverse('checkout_payment')))
+        mark_paid(first)
+        second = self.order_id(self.client.get(reverse('checkout_payment')))
+        mark_paid(second)
+        third = self.order_id(self.client.get(reverse('checkout_payment')))
+
+        self.assertEqual(len({first, second, third}), 3)
+        # Paid orders keep no key; only the open one holds it
+        self.assertEqual(PaymentOrder.objects.filter(paid_at__isnull=False, idempotency_key__isnull=True).count(), 2)
+        self.assertEqual(PaymentOrder.objects.get(idempotency_key__isnull=False).gateway_order_id, third)
+
+
+class RazorpayGatewayTests(TestCase):
+    def setUp(self):
+        self.gateway = RazorpayGateway()
+
+    def mock_transport(self, handler):
+        """Route the gateway's httpx calls to `handler` instead of the network."""
+        client = payments.httpx.AsyncClient(auth=self.gateway.auth, transport=payments.httpx.MockTransport(handler))
+        patcher = mock.patch.object(self.gateway, '_async_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @unittest.skipUnless(payments.httpx, "httpx is not installed")
+    def test_acreate_order_posts_to_the_orders_api(self):
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return payments.httpx.Response(200, json={"id": "order_abc", "amount": 1000})
+
+        self.mock_transport(handler)
+        order = asyncio.run(self.gateway.acreate_order(1000, 'INR', 'receipt-1'))
+
+        self.assertEqual(order["id"], "order_abc")
+        request = requests_seen[0]
+        self.assertEqual(str(request.url), RazorpayGateway.ORDERS_URL)
+        self.assertTrue(request.headers['authorization'].startswith('Basic '))
+        self.assertEqual(json.loads(request.content)["receipt"], 'receipt-1')
+
+    @unittest.skipUnless(payments.httpx, "httpx is not installed")
+    def test_acreate_order_raises_gateway_errors(self):
+        self.mock_transport(lambda request: payments.httpx.Response(
+            400, json={"error": {"description": "amount too small"}},
+        ))
+        with self.assertRaisesMessage(payments.razorpay.errors.BadRequestError, "amount too small"):
+            asyncio.run(self.gateway.acreate_order(1, 'INR', 'receipt-1'))
+
+    def test_async_client_is_shared_per_loop_and_closed_with_it(self):
+        class Client:
+            closed = False
+
+            def __init__(self, **kwargs):
+                pass
+
+            async def aclose(self):
+                self.closed = True
+
+        async def two_calls():
+            return await self.gateway._async_client(), await self.gateway._async_client()
+
+        fake_httpx = SimpleNamespace(AsyncClient=Client, Limits=lambda **kwargs: None)
+        with mock.patch('customer.payments.httpx', fake_httpx):
+            first, second = asyncio.run(two_calls())
+            other_loop = asyncio.run(self.gateway._async_client())
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other_loop)
+        self.assertTrue(first.closed)
+        self.assertTrue(other_loop.closed)
+
+    def test_acreate_order_without_httpx_uses_the_sync_client(self):
+        with mock.patch('customer.payments.httpx', None), \
+                mock.patch.object(self.gateway, 'create_order', return_value={"id": "order_sync"}) as create_order:
+            order = asyncio.run(self.gateway.acreate_order(1000, 'INR', 'receipt-1'))
 
-# Create your tests here.
+        self.assertEqual(order, {"id": "order_sync"})
+        create_order.assert_called_once_with(1000, 'INR', 'receipt-1')
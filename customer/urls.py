@@ -23,10 +23,10 @@ urlpatterns = [
 
     path('cart/', views.cart_view, name='customer_cart'),
     path('cart-table/', views.cart_table_view, name='cart_table'),
-    path('add-to-cart/<str:product_name>/', views.add_to_cart, name='add_to_cart'),
-    path('remove-from-cart/<str:product_name>/', views.remove_from_cart, name='remove_from_cart'),
-    path('cart/increment/<str:product_name>/', views.increment_cart_item, name='increment_cart_item'),
-    path('cart/decrement/<str:product_name>/', views.decrement_cart_item, name='decrement_cart_item'),
+    path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
+    path('remove-from-cart/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/increment/<int:product_id>/', views.increment_cart_item, name='increment_cart_item'),
+    path('cart/decrement/<int:product_id>/', views.decrement_cart_item, name='decrement_cart_item'),
 
     path("checkout/address/", views.checkout_address, name="checkout_address"),
 
@@ -35,7 +35,7 @@ urlpatterns = [
     path('subcategory/<str:subcategory_name>/', views.products_by_subcategory, name='products_by_subcategory'),
 
     # Individual product detail
-    path('product/<str:product_name>/', views.product_detail, name='product_detail'),
+    path('product/<int:product_id>/', views.product_detail, name='product_detail'),
     # Add this URL pattern
 path('orders/history/', views.order_history, name='order_history'),
 
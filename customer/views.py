@@ -6,107 +6,81 @@ from django.urls import reverse
 from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
 from pathlib import Path
 import json
-import razorpay
 from django.conf import settings
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
-from .models import CustomerProfile, CustomerOrder, NewProductNotification
+from .models import CustomerProfile, CustomerOrder, NewProductNotification, NotificationCounter
+from .notifications import notification_preview
+from .payments import aget_payment_order, mark_paid
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
 from .forms import ProfileUpdateForm
 from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from owner.catalog import get_catalog
+from owner.thumbnails import srcset, thumbnail_url
 
-DATA_FILE = Path(__file__).resolve().parent.parent / "owner" / "data.json"
+# Rendered home page product cards are cached per catalog revision
+HOME_CARDS_TIMEOUT = 24 * 60 * 60
 
 # ---------- Utilities ----------
-def load_data():
-    if DATA_FILE.exists():
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    return {"users": {}, "user_data": {}}
-
 def get_all_products():
-    data = load_data()
-    all_products = []
-    seen_products = set()
-
-    for _, udata in data.get("user_data", {}).items():
-        subcategories = udata.get("subcategories", {})
-        for cat, products in subcategories.items():
-            for p in products:
-                product_name = p.get("name")
-                if product_name and product_name not in seen_products:
-                    all_products.append({
-                        "name": product_name,
-                        "category": p.get("category", cat),
-                        "subcategory": p.get("subcategory", ""),
-                        "price": float(p.get("price", 0)),
-                        "image_path": p.get("image", "/media/products/default.png"),
-                        "description": p.get("description", ""),
-                        "rating": p.get("rating", 5),
-                        "quantity": p.get("quantity", 1)  # Ensure quantity is included
-                    })
-                    seen_products.add(product_name)
-
-        for p in udata.get("products", []):
-            product_name = p.get("name")
-            if product_name and product_name not in seen_products:
-                all_products.append({
-                    "name": product_name,
-                    "category": p.get("category", ""),
-                    "subcategory": p.get("subcategory", ""),
-                    "price": float(p.get("price", 0)),
-                    "image_path": p.get("image_path", "/media/products/default.png"),
-                    "description": p.get("description", ""),
-                    "rating": p.get("rating", 5),
-                    "quantity": p.get("quantity", 1)  # Ensure quantity is included
-                })
-                seen_products.add(product_name)
-
-    return all_products
+    # Product dicts are shared with the catalog index; copy before mutating
+    return list(get_catalog().products)
+
+def get_product(product_id):
+    return get_catalog().get_by_id(product_id)
+
+def get_cart(request):
+    """
+    The session cart, {product id (as str): quantity}. Carts saved before
+    products had ids are keyed by name and are converted on first use.
+    """
+    cart = request.session.get("cart", {})
+    if not isinstance(cart, dict):
+        cart = {}
+        request.session["cart"] = cart
+        request.session.modified = True
+    if any(not key.isdigit() for key in cart):
+        catalog = get_catalog()
+        converted = {}
+        for key, quantity in cart.items():
+            if not key.isdigit():
+                product = catalog.get(key)
+                if not product or "id" not in product:
+                    continue
+                key = str(product["id"])
+            converted[key] = converted.get(key, 0) + quantity
+        cart = converted
+        request.session["cart"] = cart
+        request.session.modified = True
+    return cart
+
+def checkout_buyer(request):
+    """Who is paying, for idempotent gateway orders: the user, or the session for guests."""
+    if request.user.is_authenticated:
+        return f"user:{request.user.id}"
+    if not request.session.session_key:
+        request.session.save()
+    return f"session:{request.session.session_key}"
 
 def get_all_categories_and_subcategories():
-    data = load_data()
     categories = {}
-    for _, udata in data.get("user_data", {}).items():
-        for p in udata.get("products", []):
-            cat = p.get("category")
-            sub = p.get("subcategory")
-            if cat:
-                if cat not in categories:
-                    categories[cat] = set()
-                if sub:
-                    categories[cat].add(sub)
-        subcategories = udata.get("subcategories", {})
-        for cat, products in subcategories.items():
-            if cat not in categories:
-                categories[cat] = set()
-            for p in products:
-                sub = p.get("subcategory")
-                if sub:
-                    categories[cat].add(sub)
-    for cat in categories:
-        categories[cat] = list(categories[cat])
+    for cat, products in get_catalog().by_category.items():
+        if cat:
+            categories[cat] = list({p["subcategory"] for p in products if p["subcategory"]})
     return categories
 
 def get_categories_with_products():
-    data = load_data()
-    user_data = data.get("user_data", {})
     result = {}
-
-    for udata in user_data.values():
-        sub_data = udata.get("subcategories", {})
-        for cat, items in sub_data.items():
-            if cat not in result:
-                result[cat] = {}
-            for item in items:
-                sub = item["subcategory"]
-                if sub not in result[cat]:
-                    result[cat][sub] = []
-                result[cat][sub].append({
-                    "name": item["name"],
-                    "image_path": item.get("image", "/media/products/default.png"),
-                    "price": item.get("price", 0),
-                })
+    for p in get_catalog().products:
+        result.setdefault(p["category"], {}).setdefault(p["subcategory"], []).append({
+            "name": p["name"],
+            "image_path": p["image_path"],
+            "price": p["price"],
+        })
     return result
 
 # ---------- Auth ----------
@@ -219,42 +193,56 @@ def profile_view(request):
     })
 
 # ---------- Shop ----------
+def render_product_card(product, cart_quantity=0):
+    image = product["image_path"]
+    return render_to_string("customer/product_card.html", {"product": dict(
+        product,
+        image=image,
+        # Resized derivatives, made on first request (owner.thumbnails)
+        image_thumb=thumbnail_url(image),
+        image_srcset=srcset(image),
+        image_webp_srcset=srcset(image, 'webp'),
+        available_quantity=max(0, product.get("quantity", 1) - cart_quantity),
+    )})
+
+def get_home_cards(catalog):
+    """
+    The home grid's product cards as rendered for an empty cart, in catalog
+    order. They only change with the catalog, so they are rendered once per
+    catalog revision and shared by every visitor.
+    """
+    key = f"customer:home_cards:v2:{catalog.revision}"
+    cards = cache.get(key)
+    if cards is None:
+        cards = [render_product_card(product) for product in catalog.products]
+        cache.set(key, cards, HOME_CARDS_TIMEOUT)
+    return cards
+
 def home(request):
-    data = load_data()
-    all_products = []
-    
-    cart = request.session.get('cart', {})
-    if not isinstance(cart, dict):
-        cart = {}
-        request.session['cart'] = cart
-        request.session.modified = True
-    
-    for email, user_data in data.get("user_data", {}).items():
-        subcategories = user_data.get("subcategories", {})
-        for category, products in subcategories.items():
-            for product in products:
-                product["category"] = category
-                if "image" in product and not product["image"].startswith("/media/"):
-                    product["image"] = f"/media/{product['image']}"
-                elif "image" not in product:
-                    product["image"] = "/media/products/default.png"
-                cart_quantity = cart.get(product["name"], 0)
-                product["available_quantity"] = max(
-                    0, product.get("quantity", 1) - cart_quantity
-                )
-                all_products.append(product)
+    cart = get_cart(request)
+    catalog = get_catalog()
+
+    cards = get_home_cards(catalog)
+    if cart:
+        # Only the cards of products in this cart show a different stock level
+        cards = list(cards)
+        for i, product in enumerate(catalog.products):
+            cart_quantity = cart.get(str(product["id"]))
+            if cart_quantity:
+                cards[i] = render_product_card(product, cart_quantity)
 
     cart_count = sum(cart.values()) if cart else 0
     new_product_added = request.session.pop('new_product_added', None)
 
     return render(request, "customer/home.html", {
-        "products": all_products,
+        "products": catalog.products,
+        "product_grid": mark_safe("".join(cards)),
         "cart_count": cart_count,
         "new_product_added": new_product_added,
     })
 
 def products_by_category(request, cat_name):
-    filtered_products = [p for p in get_all_products() if p.get("category") == cat_name]
+    filtered_products = get_catalog().by_category.get(cat_name, [])
     categories = get_all_categories_and_subcategories()
     cart = request.session.get("cart", {})
     cart_count = sum(cart.values()) if cart else 0
@@ -266,29 +254,7 @@ def products_by_category(request, cat_name):
     })
 
 def products_by_subcategory(request, sub_name):
-    data = load_data()
-    all_products = []
-    for _, udata in data.get("user_data", {}).items():
-        for p in udata.get("products", []):
-            if p.get("subcategory") == sub_name:
-                all_products.append({
-                    "name": p.get("name"),
-                    "subcategory": p.get("subcategory"),
-                    "category": p.get("category", ""),
-                    "price": p.get("price"),
-                    "image_path": p.get("image_path", "/media/products/default.png")
-                })
-        subcategories = udata.get("subcategories", {})
-        for cat, products in subcategories.items():
-            for p in products:
-                if p.get("subcategory") == sub_name:
-                    all_products.append({
-                        "name": p.get("name"),
-                        "subcategory": p.get("subcategory"),
-                        "category": cat,
-                        "price": p.get("price"),
-                        "image_path": p.get("image", "/media/products/default.png")
-                    })
+    all_products = get_catalog().by_subcategory.get(sub_name, [])
     categories = get_all_categories_and_subcategories()
     cart = request.session.get("cart", {})
     cart_count = sum(cart.values()) if cart else 0
@@ -299,16 +265,14 @@ def products_by_subcategory(request, sub_name):
         "cart_count": cart_count
     })
 
-def product_detail(request, product_name):
-    cart = request.session.get("cart", {})
-    if not isinstance(cart, dict):
-        cart = {}
-        request.session["cart"] = cart
-        request.session.modified = True
+def product_detail(request, product_id):
+    cart = get_cart(request)
 
-    product = next((p for p in get_all_products() if p.get("name") == product_name), None)
+    catalog = get_catalog()
+    product = catalog.get_by_id(product_id)
     if product:
-        cart_quantity = cart.get(product["name"], 0)
+        product = dict(product)
+        cart_quantity = cart.get(str(product_id), 0)
         product["available_quantity"] = max(0, product.get("quantity", 1) - cart_quantity)
         product["rating"] = product.get("rating", 5)
         product["description"] = product.get(
@@ -316,9 +280,9 @@ def product_detail(request, product_name):
             f"This is a high-quality {product['name']}. Crafted with premium materials, it offers comfort, style, and durability. Perfect for daily wear or special occasions."
         )
         related_products = [
-            {**p, "rating": p.get("rating", 5), "available_quantity": max(0, p.get("quantity", 1) - cart.get(p["name"], 0))}
-            for p in get_all_products()
-            if p.get("subcategory") == product.get("subcategory") and p.get("name") != product_name
+            {**p, "rating": p.get("rating", 5), "available_quantity": max(0, p.get("quantity", 1) - cart.get(str(p["id"]), 0))}
+            for p in catalog.by_subcategory.get(product.get("subcategory"), [])
+            if p["id"] != product_id
         ]
     else:
         related_products = []
@@ -334,158 +298,124 @@ def product_detail(request, product_name):
     })
 
 # ---------- Cart ----------
-def add_to_cart(request, product_name):
-    cart = request.session.get('cart', {})
-    if not isinstance(cart, dict):
-        cart = {}
-        request.session['cart'] = cart
-        request.session.modified = True
+def add_to_cart(request, product_id):
+    cart = get_cart(request)
+
+    product = get_product(product_id)
 
-    data = load_data()
-    product_quantity = 0
-    product_found = False
-
-    for email, user_data in data.get("user_data", {}).items():
-        subcategories = user_data.get("subcategories", {})
-        for category, products in subcategories.items():
-            for product in products:
-                if product["name"] == product_name:
-                    product_quantity = product.get("quantity", 1)
-                    product_found = True
-                    break
-            if product_found:
-                break
-        if product_found:
-            break
-
-    if not product_found:
-        messages.error(request, f"Product {product_name} not found.")
-        return redirect("product_detail", product_name=product_name)
-
-    current_in_cart = cart.get(product_name, 0)
+    if not product:
+        messages.error(request, f"Product {product_id} not found.")
+        return redirect("product_detail", product_id=product_id)
+
+    product_name = product["name"]
+    product_quantity = product["quantity"]
+    key = str(product_id)
+    current_in_cart = cart.get(key, 0)
     if current_in_cart >= product_quantity:
         messages.warning(request, f"Sorry, only {product_quantity} units of {product_name} are available.")
-        return redirect("product_detail", product_name=product_name)
+        return redirect("product_detail", product_id=product_id)
 
-    cart[product_name] = current_in_cart + 1
+    cart[key] = current_in_cart + 1
     request.session['cart'] = cart
     request.session['new_product_added'] = product_name
     request.session.modified = True
 
     messages.success(request, f"Added {product_name} to your cart!")
-    return redirect(reverse("product_detail", kwargs={"product_name": product_name}) + "?added_to_cart=true")
+    return redirect(reverse("product_detail", kwargs={"product_id": product_id}) + "?added_to_cart=true")
 
-def remove_from_cart(request, product_name):
-    cart = request.session.get("cart", {})
-    if product_name in cart:
-        del cart[product_name]
+def remove_from_cart(request, product_id):
+    cart = get_cart(request)
+    key = str(product_id)
+    if key in cart:
+        del cart[key]
         notified_products = request.session.get("notified_products", [])
-        if product_name in notified_products:
-            notified_products.remove(product_name)
+        if key in notified_products:
+            notified_products.remove(key)
             request.session["notified_products"] = notified_products
     request.session["cart"] = cart
     request.session.modified = True
     return redirect("customer_cart")
 
 def cart_view(request):
-    data = load_data()
-    cart = request.session.get("cart", {})
-    if not isinstance(cart, dict):
-        cart = {}
-        request.session["cart"] = cart
-        request.session.modified = True
+    cart = get_cart(request)
 
-    all_products = get_all_products()
+    catalog = get_catalog()
     cart_products = []
-    for product_name, quantity in cart.items():
-        for p in all_products:
-            if p["name"] == product_name:
-                available_quantity = max(0, p.get("quantity", 1) - quantity)
-                cart_products.append({
-                    "name": p["name"],
-                    "price": p["price"],
-                    "image_path": p["image_path"],
-                    "quantity": quantity,
-                    "available_quantity": available_quantity
-                })
+    for product_id, quantity in cart.items():
+        p = catalog.get_by_id(int(product_id))
+        if p:
+            available_quantity = max(0, p.get("quantity", 1) - quantity)
+            cart_products.append({
+                "id": p["id"],
+                "name": p["name"],
+                "price": p["price"],
+                "image_path": p["image_path"],
+                "quantity": quantity,
+                "available_quantity": available_quantity
+            })
     request.session["cart_seen"] = True
     return render(request, "customer/cart.html", {
         "products": cart_products
     })
 
 def cart_table_view(request):
-    cart = request.session.get("cart", {})
-    all_products = get_all_products()
+    cart = get_cart(request)
+    catalog = get_catalog()
     cart_products = []
     grand_total = 0
-    for product_name, quantity in cart.items():
-        for p in all_products:
-            if p["name"] == product_name:
-                total_price = quantity * float(p["price"])
-                grand_total += total_price
-                available_quantity = max(0, p.get("quantity", 1) - quantity)
-                cart_products.append({
-                    "name": p["name"],
-                    "price": p["price"],
-                    "image_path": p["image_path"],
-                    "quantity": quantity,
-                    "total_price": total_price,
-                    "available_quantity": available_quantity
-                })
+    for product_id, quantity in cart.items():
+        p = catalog.get_by_id(int(product_id))
+        if p:
+            total_price = quantity * float(p["price"])
+            grand_total += total_price
+            available_quantity = max(0, p.get("quantity", 1) - quantity)
+            cart_products.append({
+                "id": p["id"],
+                "name": p["name"],
+                "price": p["price"],
+                "image_path": p["image_path"],
+                "quantity": quantity,
+                "total_price": total_price,
+                "available_quantity": available_quantity
+            })
     return render(request, "customer/cart_table.html", {
         "products": cart_products,
         "grand_total": grand_total
     })
 
-def increment_cart_item(request, product_name):
-    cart = request.session.get("cart", {})
-    if not isinstance(cart, dict):
-        cart = {}
-        request.session["cart"] = cart
-        request.session.modified = True
+def increment_cart_item(request, product_id):
+    cart = get_cart(request)
+
+    product = get_product(product_id)
 
-    data = load_data()
-    product_quantity = 0
-    product_found = False
-
-    for email, user_data in data.get("user_data", {}).items():
-        subcategories = user_data.get("subcategories", {})
-        for category, products in subcategories.items():
-            for product in products:
-                if product["name"] == product_name:
-                    product_quantity = product.get("quantity", 1)
-                    product_found = True
-                    break
-            if product_found:
-                break
-        if product_found:
-            break
-
-    if not product_found:
-        messages.error(request, f"Product {product_name} not found.")
+    if not product:
+        messages.error(request, f"Product {product_id} not found.")
         return redirect("customer_cart")
 
-    current_in_cart = cart.get(product_name, 0)
+    product_quantity = product["quantity"]
+    key = str(product_id)
+    current_in_cart = cart.get(key, 0)
     if current_in_cart >= product_quantity:
-        messages.warning(request, f"Sorry, only {product_quantity} units of {product_name} are available.")
+        messages.warning(request, f"Sorry, only {product_quantity} units of {product['name']} are available.")
         return redirect("customer_cart")
 
-    cart[product_name] = current_in_cart + 1
+    cart[key] = current_in_cart + 1
     request.session["cart"] = cart
     request.session["new_product_added"] = None
     request.session.modified = True
     return redirect("customer_cart")
 
-def decrement_cart_item(request, product_name):
-    cart = request.session.get("cart", {})
-    if product_name in cart:
-        if cart[product_name] > 1:
-            cart[product_name] -= 1
+def decrement_cart_item(request, product_id):
+    cart = get_cart(request)
+    key = str(product_id)
+    if key in cart:
+        if cart[key] > 1:
+            cart[key] -= 1
         else:
-            del cart[product_name]
+            del cart[key]
             notified_products = request.session.get("notified_products", [])
-            if product_name in notified_products:
-                notified_products.remove(product_name)
+            if key in notified_products:
+                notified_products.remove(key)
                 request.session["notified_products"] = notified_products
     request.session["cart"] = cart
     request.session["new_product_added"] = None
@@ -543,28 +473,30 @@ def checkout_address(request):
         "selected_address": request.session.get("address")
     })
 
-def checkout_payment(request):
-    cart = request.session.get("cart", {})
-    all_products = get_all_products()
+def checkout_summary(request):
+    """Cart lines, totals and coupon of the payment page; everything but the gateway order."""
+    cart = get_cart(request)
+    catalog = get_catalog()
 
     total = 0
     cart_products = []
 
-    for product_name, quantity in cart.items():
-        for p in all_products:
-            if p["name"] == product_name:
-                price = float(p["price"])
-                item_total = price * quantity
-                total += item_total
-                available_quantity = max(0, p.get("quantity", 1) - quantity)
-                cart_products.append({
-                    "name": p["name"],
-                    "price": price,
-                    "quantity": quantity,
-                    "total": item_total,
-                    "image_path": p.get("image_path", ""),
-                    "available_quantity": available_quantity
-                })
+    for product_id, quantity in cart.items():
+        p = catalog.get_by_id(int(product_id))
+        if p:
+            price = float(p["price"])
+            item_total = price * quantity
+            total += item_total
+            available_quantity = max(0, p.get("quantity", 1) - quantity)
+            cart_products.append({
+                "id": p["id"],
+                "name": p["name"],
+                "price": price,
+                "quantity": quantity,
+                "total": item_total,
+                "image_path": p.get("image_path", ""),
+                "available_quantity": available_quantity
+            })
 
     discount = 0
     grand_total = total
@@ -578,34 +510,46 @@ def checkout_payment(request):
             grand_total = total - discount
             coupon_applied = True
 
-    amount_in_paise = int(grand_total * 100)
-    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_SECRET_KEY))
-    razorpay_order = client.order.create({
-        "amount": amount_in_paise,
-        "currency": "INR",
-        "payment_capture": 1
-    })
-
-    request.session["invoice"] = {
-        "products": cart_products,
+    return {
+        "cart_products": cart_products,
         "total": total,
         "discount": discount,
         "grand_total": grand_total,
-        "order_id": razorpay_order['id']
+        "amount": int(grand_total * 100),
+        "coupon_applied": coupon_applied,
+        "coupon_code": coupon_code,
+        "buyer": checkout_buyer(request),
+    }
+
+def render_checkout_payment(request, summary, razorpay_order_id):
+    request.session["invoice"] = {
+        "products": summary["cart_products"],
+        "total": summary["total"],
+        "discount": summary["discount"],
+        "grand_total": summary["grand_total"],
+        "order_id": razorpay_order_id
     }
 
     return render(request, "customer/checkout_payment.html", {
-        "cart_products": cart_products,
-        "total": total,
-        "discount": discount,
-        "grand_total": grand_total,
+        "cart_products": summary["cart_products"],
+        "total": summary["total"],
+        "discount": summary["discount"],
+        "grand_total": summary["grand_total"],
         "razorpay_key": settings.RAZORPAY_KEY_ID,
-        "razorpay_order_id": razorpay_order["id"],
-        "amount": amount_in_paise,
-        "coupon_applied": coupon_applied,
-        "coupon_code": coupon_code
+        "razorpay_order_id": razorpay_order_id,
+        "amount": summary["amount"],
+        "coupon_applied": summary["coupon_applied"],
+        "coupon_code": summary["coupon_code"]
     })
 
+# Async so the gateway round-trip is awaited instead of holding a worker
+# thread; session, ORM and template work still runs through sync_to_async
+async def checkout_payment(request):
+    summary = await sync_to_async(checkout_summary)(request)
+    # Reloads and coupon resubmissions reuse the gateway order for an unchanged checkout
+    razorpay_order_id = await aget_payment_order(summary["buyer"], summary["cart_products"], summary["amount"])
+    return await sync_to_async(render_checkout_payment)(request, summary, razorpay_order_id)
+
 def place_order(request):
     if request.method == "POST":
         request.session["notified_products"] = []
@@ -614,7 +558,10 @@ def place_order(request):
         return redirect("customer_home")
     return redirect("checkout_payment")
 
-def payment_success(request):
+async def payment_success(request):
+    return await sync_to_async(confirm_payment)(request)
+
+def confirm_payment(request):
     invoice = request.session.get("invoice", {})
     address = request.session.get("address", {})
     
@@ -624,6 +571,8 @@ def payment_success(request):
         messages.error(request, "No order information found. Please contact support.")
         return redirect("customer_home")
     
+    mark_paid(order_id)
+
     if request.user.is_authenticated and invoice and address:
         if not CustomerOrder.objects.filter(order_id=order_id).exists():
             CustomerOrder.objects.create(
@@ -754,15 +703,12 @@ def order_history(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    all_products = get_all_products()
+    catalog = get_catalog()
     for order in page_obj:
         for product in order.products:
-            for p in all_products:
-                if p["name"] == product["name"]:
-                    product["image_path"] = p.get("image_path", "/media/products/default.png")
-                    break
-            else:
-                product["image_path"] = "/media/products/default.png"
+            # Orders placed before product ids existed only have the name
+            p = catalog.get_by_id(product["id"]) if "id" in product else catalog.get(product["name"])
+            product["image_path"] = p.get("image_path", "/media/products/default.png") if p else "/media/products/default.png"
     
     return render(request, "customer/order_history.html", {
         "page_obj": page_obj,
@@ -772,31 +718,8 @@ def order_history(request):
 def notifications_view(request):
     if not request.user.is_authenticated:
         return JsonResponse({'count': 0, 'notifications': []})
-    
-    unread_notifications = NewProductNotification.objects.filter(
-        is_active=True
-    ).exclude(
-        notified_users=request.user
-    )
-    
-    count = unread_notifications.count()
-    
-    notifications = []
-    for notification in unread_notifications[:5]:
-        product = next((p for p in get_all_products() if p.get("name") == notification.product_name), None)
-        if product:
-            notifications.append({
-                'id': notification.id,
-                'product_name': notification.product_name,
-                'added_date': notification.added_date.strftime('%Y-%m-%d %H:%M'),
-                'image_path': product.get('image_path', '/media/products/default.png'),
-                'product_url': reverse('product_detail', args=[notification.product_name])
-            })
-    
-    return JsonResponse({
-        'count': count,
-        'notifications': notifications
-    })
+
+    return JsonResponse(notification_preview(request.user))
 
 def mark_notification_read(request, notification_id):
     if not request.user.is_authenticated:
@@ -812,24 +735,37 @@ def mark_notification_read(request, notification_id):
 def all_notifications_view(request):
     if not request.user.is_authenticated:
         return redirect('customer_login')
-    
-    all_notifications = NewProductNotification.objects.filter(is_active=True)
-    
-    for notification in all_notifications.exclude(notified_users=request.user):
-        notification.notified_users.add(request.user)
-    
+
+    all_notifications = list(NewProductNotification.objects.filter(is_active=True))
+
+    # What was read before this visit, so the page can still highlight the rest
+    ReadNotification = NewProductNotification.notified_users.through
+    read_ids = set(
+        ReadNotification.objects.filter(user_id=request.user.id).values_list('newproductnotification_id', flat=True)
+    )
+
+    # Mark everything read with a single insert
+    unread = [notification for notification in all_notifications if notification.id not in read_ids]
+    if unread:
+        ReadNotification.objects.bulk_create(
+            [ReadNotification(newproductnotification_id=notification.id, user_id=request.user.id) for notification in unread],
+            ignore_conflicts=True,
+        )
+        # A notification may have been added meanwhile, so recount rather than zero
+        NotificationCounter.invalidate([request.user.id])
+
+    catalog = get_catalog()
     notifications_with_details = []
     for notification in all_notifications:
-        product = next((p for p in get_all_products() if p.get("name") == notification.product_name), None)
+        product = catalog.get(notification.product_name)
         if product:
-            is_read = notification.notified_users.filter(id=request.user.id).exists()
             notifications_with_details.append({
                 'notification': notification,
                 'product': product,
-                'is_read': is_read,
-                'product_url': reverse('product_detail', args=[notification.product_name])
+                'is_read': notification.id in read_ids,
+                'product_url': reverse('product_detail', args=[product['id']])
             })
-    
+
     return render(request, 'customer/all_notifications.html', {
         'notifications': notifications_with_details
-    })
\ No newline at end of file
+    })
@@ -0,0 +1,630 @@
+# owner/catalog.py
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = Path(__file__).resolve().parent / 'data.json'
+LOCK_FILE = DATA_FILE.with_name(DATA_FILE.name + '.lock')
+JOURNAL_FILE = DATA_FILE.with_name('data.journal.jsonl')
+
+# Once the journal grows past this size the next write folds it into data.json
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+# -------------------- Per-process catalog cache --------------------
+# data.json is a snapshot; single-product edits are appended to
+# data.journal.jsonl instead of rewriting it. The snapshot is parsed once per
+# worker process and each call revalidates it with a stat(), then applies any
+# journal lines appended since the last call. Every journal entry carries a
+# sequence number and the snapshot records the last one it contains
+# ("journal_seq"), so entries already folded into the snapshot are skipped.
+_lock = threading.Lock()
+_cache = {"key": None, "data": None, "journal": None, "offset": 0}
+
+
+_MISSING = object()
+
+
+class CatalogDocument(dict):
+    """
+    A private, editable copy of data.json. It remembers the snapshot it was
+    copied from so save_catalog() can tell which entries this copy changed.
+    """
+    base = None
+
+
+def empty_catalog():
+    return {"users": {}, "user_data": {}}
+
+
+def _stat_key(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _snapshot_key():
+    try:
+        return _stat_key(os.stat(DATA_FILE))
+    except FileNotFoundError:
+        return None
+
+
+def catalog_version():
+    """Return a hashable token that changes whenever the catalog on disk changes."""
+    try:
+        journal = _stat_key(os.stat(JOURNAL_FILE))
+    except FileNotFoundError:
+        journal = None
+    return _snapshot_key(), journal
+
+
+def _read_snapshot(key):
+    """Bring the cached snapshot up to date with data.json. Call with _lock held."""
+    if key is None:
+        _cache["key"] = None
+        _cache["data"] = empty_catalog()
+    elif _cache["key"] != key:
+        try:
+            with open(DATA_FILE, 'r', encoding='utf-8') as f:
+                # Key the snapshot on the file we actually read, in case
+                # data.json was replaced between the stat() and the open().
+                file_key = _stat_key(os.fstat(f.fileno()))
+                data = json.load(f)
+        except ValueError:
+            # Never replace a good snapshot with a damaged file
+            if _cache["data"] is None:
+                raise
+            logger.error("data.json could not be parsed, serving the last good snapshot")
+            return
+        _cache["key"] = file_key
+        _cache["data"] = data
+        logger.debug("Reloaded data.json into catalog cache")
+    else:
+        return
+    # A new snapshot is replayed against the journal from the start
+    _cache["journal"] = None
+    _cache["offset"] = 0
+
+
+def _read_journal():
+    """Apply the journal lines appended since the last call. Call with _lock held."""
+    try:
+        f = open(JOURNAL_FILE, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        st = os.fstat(f.fileno())
+        if _cache["journal"] != st.st_ino or st.st_size < _cache["offset"]:
+            _cache["journal"] = st.st_ino
+            _cache["offset"] = 0
+        if st.st_size == _cache["offset"]:
+            return
+        f.seek(_cache["offset"])
+        tail = f.read()
+
+    # Only complete lines; a writer may be half way through the last one
+    end = tail.rfind(b'\n') + 1
+    data = _cache["data"]
+    seq = data.get("journal_seq", 0)
+    for line in tail[:end].splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            logger.error("Skipping unreadable line in %s", JOURNAL_FILE.name)
+            continue
+        if entry["seq"] <= seq:
+            continue
+        for change in entry["changes"]:
+            data = _apply_change(data, entry["owner"], change) or data
+        seq = entry["seq"]
+        data = dict(data, journal_seq=seq)
+    _cache["data"] = data
+    _cache["offset"] += end
+
+
+def _refresh():
+    """Return the cached document, brought up to date with data.json and its journal."""
+    with _lock:
+        for _ in range(3):
+            key = _snapshot_key()
+            _read_snapshot(key)
+            _read_journal()
+            # data.json was compacted while we read the journal: start over
+            if _snapshot_key() == key:
+                break
+        return _cache["data"]
+
+
+def _apply_change(data, email, change):
+    """
+    Apply one journal change to a catalog document. The document is not
+    modified: the entries on the path to the change are copied instead, so
+    callers holding the previous document keep a consistent view. Returns
+    None when no entry matches.
+
+    A change locates one entry by owner, section ("subcategories" or
+    "products"), category (subcategories only) and its product id (or name,
+    when no "id" is given), and either deletes it ({"op": "delete"}) or
+    updates some of its fields ({"op": "update", "fields": {...}}).
+    """
+    found = _find_entry(data, email, change)
+    if found is None:
+        return None
+    udata = data["user_data"][email]
+    section = change["section"]
+    items, index = found
+
+    items = list(items)
+    if change["op"] == "delete":
+        del items[index]
+    else:
+        items[index] = dict(items[index], **change["fields"])
+
+    udata = dict(udata)
+    if section == "subcategories":
+        udata["subcategories"] = dict(udata["subcategories"], **{change["category"]: items})
+    else:
+        udata["products"] = items
+    return dict(data, user_data=dict(data["user_data"], **{email: udata}))
+
+
+def _find_entry(data, email, change):
+    """(entries list, index) of the entry a change addresses, or None."""
+    udata = data.get("user_data", {}).get(email)
+    if udata is None:
+        return None
+    if change["section"] == "subcategories":
+        items = udata.get("subcategories", {}).get(change.get("category"))
+    else:
+        items = udata.get("products")
+    if "id" in change:
+        key, value = "id", change["id"]
+    else:
+        key, value = "name", change["name"]
+    index = next((i for i, p in enumerate(items or []) if p.get(key) == value), None)
+    if index is None:
+        return None
+    return items, index
+
+
+def _iter_entries(udata):
+    """Yield every product entry an owner lists, in subcategories and products[]."""
+    for items in udata.get("subcategories", {}).values():
+        yield from items
+    yield from udata.get("products", [])
+
+
+def _assign_ids(data):
+    """
+    Give every product entry without one a stable integer "id". Ids come from
+    the document's "last_product_id" counter, which only ever goes up, so an
+    id is never reused after its product is deleted: URLs, carts and order
+    snapshots keep pointing at the product they were made for. Owners whose
+    entries get new ids are copied rather than modified.
+    """
+    user_data = data.get("user_data", {})
+    last = max(
+        [data.get("last_product_id", 0)]
+        + [p.get("id", 0) for udata in user_data.values() for p in _iter_entries(udata)]
+    )
+    updated = {}
+    for email, udata in user_data.items():
+        if all("id" in p for p in _iter_entries(udata)):
+            continue
+        udata = copy.deepcopy(udata)
+        for p in _iter_entries(udata):
+            if "id" not in p:
+                last += 1
+                p["id"] = last
+        updated[email] = udata
+    if not updated and data.get("last_product_id") == last:
+        return data
+    return dict(data, user_data=dict(user_data, **updated), last_product_id=last)
+
+
+def load_catalog(copy_data=False):
+    """
+    Return the catalog document: data.json with its journal applied.
+
+    The returned dict is shared by every caller in the process and must be
+    treated as read-only. Callers that modify the catalog before saving it
+    must pass copy_data=True to get a private deep copy.
+    """
+    data = _refresh()
+
+    if copy_data:
+        document = CatalogDocument(copy.deepcopy(data))
+        document.base = data
+        return document
+    return data
+
+
+def invalidate_catalog():
+    """Drop the cached document so the next load re-reads data.json."""
+    with _lock:
+        _cache["key"] = None
+        _cache["data"] = None
+        _cache["journal"] = None
+        _cache["offset"] = 0
+    invalidate_product_catalog()
+
+
+# -------------------- Indexed product catalog --------------------
+DEFAULT_PRODUCT_IMAGE = "/media/products/default.png"
+
+# How long a worker trusts its in-memory Catalog before re-checking the
+# catalog revision in the database.
+REVISION_CHECK_INTERVAL = 1.0
+
+
+def image_url(image):
+    """URL for an image stored on a catalog Product ('products/x.jpg' -> '/media/products/x.jpg')."""
+    from django.conf import settings
+
+    if not image:
+        return DEFAULT_PRODUCT_IMAGE
+    if image.startswith('/'):
+        return image
+    return f"{settings.MEDIA_URL}{image}"
+
+
+class Catalog:
+    """
+    Read-only snapshot of the storefront products with hash indexes by id,
+    name, category, subcategory and owner. Product names are unique across the
+    storefront listing: the first owner to list a name wins, as in the old
+    get_all_products(). Every product stays reachable through by_id.
+    """
+
+    def __init__(self, revision=None):
+        self.revision = revision
+        self.products = []
+        self.by_id = {}
+        self.by_name = {}
+        self.by_category = {}
+        self.by_subcategory = {}
+        self.by_owner = {}
+
+    @classmethod
+    def from_document(cls, data, revision=None):
+        """Build the catalog from a data.json document."""
+        catalog = cls(revision)
+        for email, udata in data.get("user_data", {}).items():
+            for cat, items in udata.get("subcategories", {}).items():
+                for p in items:
+                    catalog.add(email, p, p.get("category", cat), p.get("image", DEFAULT_PRODUCT_IMAGE))
+            for p in udata.get("products", []):
+                catalog.add(email, p, p.get("category", ""), p.get("image_path", DEFAULT_PRODUCT_IMAGE))
+        return catalog
+
+    @classmethod
+    def from_db(cls, revision=None):
+        """Build the catalog from the owner.Product table in a single query."""
+        from .models import Product
+
+        catalog = cls(revision)
+        rows = (
+            Product.objects.filter(owner__isnull=False)
+            .order_by('owner_id', 'id')
+            .values_list('id', 'name', 'category__name', 'subcategory__name', 'price',
+                         'image', 'description', 'rating', 'quantity', 'owner__email')
+        )
+        for pk, name, category, subcategory, price, image, description, rating, quantity, email in rows:
+            catalog.add(email, {
+                "id": pk,
+                "name": name,
+                "subcategory": subcategory or "",
+                "price": price,
+                "description": description,
+                "rating": 5 if rating is None else rating,
+                "quantity": quantity,
+            }, category or "", image_url(image))
+        return catalog
+
+    def add(self, email, p, category, image_path):
+        name = p.get("name")
+        if not name:
+            return
+        product = {
+            "name": name,
+            "category": category,
+            "subcategory": p.get("subcategory", ""),
+            "price": float(p.get("price", 0)),
+            "image_path": image_path,
+            "description": p.get("description", ""),
+            "rating": p.get("rating", 5),
+            "quantity": p.get("quantity", 1),
+            "owner": email,
+        }
+        if "id" in p:
+            product["id"] = p["id"]
+            self.by_id[p["id"]] = product
+        if name in self.by_name:
+            return
+        self.products.append(product)
+        self.by_name[name] = product
+        self.by_category.setdefault(category, []).append(product)
+        self.by_subcategory.setdefault(product["subcategory"], []).append(product)
+        self.by_owner.setdefault(email, []).append(product)
+
+    def get(self, name):
+        return self.by_name.get(name)
+
+    def get_by_id(self, product_id):
+        return self.by_id.get(product_id)
+
+
+_catalog_lock = threading.Lock()
+_catalog = {"catalog": None, "checked": 0.0}
+
+
+def get_catalog():
+    """
+    Return the storefront Catalog, served from the catalog tables. It is
+    rebuilt only when CatalogRevision changes, and the revision itself is
+    checked at most once per REVISION_CHECK_INTERVAL.
+    """
+    from .models import CatalogRevision
+
+    now = time.monotonic()
+    catalog = _catalog["catalog"]
+    if catalog is not None and now - _catalog["checked"] < REVISION_CHECK_INTERVAL:
+        return catalog
+
+    revision = CatalogRevision.current()
+    with _catalog_lock:
+        catalog = _catalog["catalog"]
+        if catalog is None or catalog.revision != revision:
+            catalog = Catalog.from_db(revision)
+            _catalog["catalog"] = catalog
+        _catalog["checked"] = now
+        return catalog
+
+
+def invalidate_product_catalog():
+    """Force the next get_catalog() call to re-check the catalog revision."""
+    _catalog["checked"] = 0.0
+
+
+# -------------------- Locked, atomic writes --------------------
+_write_lock = threading.RLock()
+
+
+@contextmanager
+def catalog_lock():
+    """
+    Exclusive lock around a read-modify-write of data.json. It is held across
+    threads of this process and, via an advisory lock on data.json.lock,
+    across worker processes.
+    """
+    with _write_lock:
+        with open(LOCK_FILE, 'a+b') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomic(data, path=None):
+    """Write data.json via temp file + fsync + os.replace so readers never see a partial file."""
+    path = path or DATA_FILE
+    directory = str(path.parent)
+    fd, tmp_path = tempfile.mkstemp(prefix='.data.json.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            if data is not None:
+                json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # Make the rename itself durable
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _merge_changes(current, base, edited):
+    """
+    Apply the owner-level entries that `edited` changed relative to `base`
+    onto `current`, the latest document on disk. Edits by other owners that
+    landed since `base` was read are kept.
+    """
+    merged = {key: dict(value) if isinstance(value, dict) else value for key, value in current.items()}
+    changed = set()
+    for section in set(base) | set(edited):
+        base_section = base.get(section, {})
+        edited_section = edited.get(section, {})
+        if not (isinstance(base_section, dict) and isinstance(edited_section, dict)):
+            if edited_section != base_section:
+                merged[section] = edited_section
+            continue
+        target = merged.setdefault(section, {})
+        for key in set(base_section) | set(edited_section):
+            old = base_section.get(key, _MISSING)
+            new = edited_section.get(key, _MISSING)
+            if old == new:
+                continue
+            changed.add(key)
+            if new is _MISSING:
+                target.pop(key, None)
+            else:
+                target[key] = new
+    return merged, changed
+
+
+def _compact(data):
+    """Write `data` as the new snapshot and start an empty journal. Call under catalog_lock()."""
+    current = load_catalog()
+    # A document written without the counter must not lower it
+    last = max(data.get("last_product_id", 0), current.get("last_product_id", 0))
+    data = dict(_assign_ids(dict(data, last_product_id=last)), journal_seq=current.get("journal_seq", 0))
+    _write_atomic(data)
+    # data.json now holds every journal entry, so the old journal can go
+    if JOURNAL_FILE.exists():
+        _write_atomic(None, JOURNAL_FILE)
+    return data
+
+
+def compact_catalog():
+    """Fold the journal into data.json."""
+    with catalog_lock():
+        _compact(load_catalog())
+
+
+def assign_product_ids():
+    """Make sure every product in data.json has an id, saving only if some were missing."""
+    with catalog_lock():
+        data = load_catalog()
+        if _assign_ids(data) is not data:
+            _compact(data)
+
+
+def record_changes(email, changes):
+    """
+    Apply single-entry changes (see _apply_change) to one owner's catalog by
+    appending them to the journal, without rewriting data.json. Changes that
+    match no entry are dropped. Only the table rows of the changed entries are
+    synced, so an edit costs the same however big the catalog is. Returns
+    True if anything was recorded.
+    """
+    with catalog_lock():
+        current = load_catalog()
+        # Every save gives all entries an id and stores the counter, so only
+        # documents written before that need a full pass, once
+        if "last_product_id" not in current:
+            current = _compact(current)
+        applied = []
+        product_ids = set()
+        for change in changes:
+            found = _find_entry(current, email, change)
+            if found is None:
+                continue
+            items, index = found
+            product_ids.add(items[index].get("id"))
+            current = _apply_change(current, email, change)
+            applied.append(change)
+        if not applied:
+            return False
+
+        entry = {"seq": current.get("journal_seq", 0) + 1, "owner": email, "changes": applied}
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        fd = os.open(JOURNAL_FILE, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size:
+                os.lseek(fd, size - 1, os.SEEK_SET)
+                if os.read(fd, 1) != b'\n':
+                    # A writer died half way through a line: end it, so this
+                    # entry isn't glued onto the unreadable fragment
+                    line = b'\n' + line
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        current = load_catalog()
+        if os.path.getsize(JOURNAL_FILE) > JOURNAL_COMPACT_BYTES:
+            current = _compact(current)
+        _sync_tables(current, {email}, product_ids)
+    return True
+
+
+def merge_entries(email, entries):
+    """
+    Insert or update subcategory entries of one owner in the latest document,
+    under the lock, so edits made while the entries were prepared (a long
+    import, say) are kept. Each entry is a dict with "category", "name",
+    optionally the "id" it was matched to earlier, "fields" to set and
+    "defaults" for when it is new. An entry is located by id, then by
+    category and name; only its "fields" change.
+    """
+    with catalog_lock():
+        current = load_catalog()
+        udata = copy.deepcopy(current.get("user_data", {}).get(email, {}))
+        subcategories = udata.setdefault("subcategories", {})
+        by_id, by_name = {}, {}
+        for category, items in subcategories.items():
+            for p in items:
+                if "id" in p:
+                    by_id[p["id"]] = (category, p)
+                by_name.setdefault((category, p["name"]), p)
+
+        for entry in entries:
+            category, name = entry["category"], entry["name"]
+            found_category, p = by_id.get(entry.get("id"), (None, None))
+            if found_category != category:
+                p = by_name.get((category, name))
+            if p is not None:
+                p.update(entry["fields"])
+            else:
+                p = dict(entry.get("defaults", {}), name=name, category=category, **entry["fields"])
+                subcategories.setdefault(category, []).append(p)
+                by_name[(category, name)] = p
+
+        data = _compact(dict(current, user_data=dict(current.get("user_data", {}), **{email: udata})))
+        _sync_tables(data, {email})
+    return data
+
+
+def save_catalog(data):
+    """
+    Persist a catalog document. Copies obtained from load_catalog(copy_data=True)
+    are merged into the latest version on disk under the lock, so concurrent
+    edits by different owners do not overwrite each other. The owners that
+    changed are then mirrored into the catalog tables the storefront reads.
+    Saving a whole document also compacts the journal.
+    """
+    with catalog_lock():
+        base = getattr(data, 'base', None)
+        if base is not None:
+            to_write, changed = _merge_changes(load_catalog(), base, data)
+        else:
+            to_write, changed = data, None
+        to_write = _compact(to_write)
+        if base is not None:
+            # Further saves of the same copy only carry later changes
+            data.base = copy.deepcopy(dict(data))
+
+        if changed is None or changed:
+            _sync_tables(to_write, changed)
+
+
+def _sync_tables(data, emails, product_ids=None):
+    try:
+        from .sync import sync_catalog
+        sync_catalog(data, emails, product_ids=product_ids)
+    except Exception:
+        # data.json is already saved; `manage.py sync_data` repairs the tables
+        logger.exception("Error mirroring data.json into the catalog tables")
+    invalidate_product_catalog()
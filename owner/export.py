@@ -0,0 +1,78 @@
+# owner/export.py
+import csv
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import StreamingHttpResponse
+
+from .catalog import load_catalog
+from .models import Category
+
+# DB rows fetched per round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+# CSV text is sent in chunks of roughly this many characters
+STREAM_BUFFER_SIZE = 64 * 1024
+
+CATEGORY_HEADER = ['Name', 'Description', 'Image Path']
+SUBCATEGORY_HEADER = ['Category', 'Subcategory', 'Product Name', 'Price', 'Description', 'Image Path']
+
+
+class Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows, buffer_size=STREAM_BUFFER_SIZE):
+    """Yield CSV text for `header` and `rows`, a buffer at a time, without holding the whole file."""
+    writer = csv.writer(Echo())
+    buffer = [writer.writerow(header)]
+    size = len(buffer[0])
+    for row in rows:
+        line = writer.writerow(row)
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _category_image_path(category):
+    if not category.image:
+        return ''
+    try:
+        return category.image.path
+    except SuspiciousFileOperation:
+        # The field default is a /static/ URL, which is not under MEDIA_ROOT
+        return category.image.name
+
+
+def category_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    categories = Category.objects.only('name', 'description', 'image').order_by('name')
+    for category in categories.iterator(chunk_size=chunk_size):
+        image_path = _category_image_path(category)
+        yield [category.name, category.description or '', image_path]
+
+
+def subcategory_rows(email):
+    """Rows for an owner's subcategory entries, read from the shared catalog without copying it."""
+    user_data = load_catalog()['user_data'].get(email, {})
+    for category, subs in user_data.get("subcategories", {}).items():
+        for sc in subs:
+            yield [
+                category,
+                sc.get("subcategory", ""),
+                sc.get("name", ""),
+                sc.get("price", 0),
+                sc.get("description", ""),
+                sc.get("image", "/media/products/default.png"),
+            ]
+
+
+def csv_response(filename, header, rows):
+    response = StreamingHttpResponse(csv_chunks(header, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
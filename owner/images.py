@@ -0,0 +1,145 @@
+# owner/images.py
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from .media import media_url, store_chunks
+
+logger = logging.getLogger(__name__)
+
+# Image files copied at once during an import
+IMAGE_WORKERS = getattr(settings, 'IMAGE_INGEST_WORKERS', 8)
+
+# Seconds one image may take to copy and validate
+IMAGE_TIMEOUT = getattr(settings, 'IMAGE_INGEST_TIMEOUT', 30)
+
+COPY_CHUNK_SIZE = 256 * 1024
+
+
+class ImageIngestError(Exception):
+    pass
+
+
+class IngestedImage:
+    def __init__(self, name, sha256, size):
+        self.name = name
+        self.sha256 = sha256
+        self.size = size
+
+    @property
+    def url(self):
+        return media_url(self.name)
+
+
+def _verify_image(path):
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        raise ImageIngestError("not a valid image")
+
+
+def ingest_image(source_path, kind, deadline=None):
+    """
+    Copy a local image into content-addressed storage under `kind` (see
+    owner.media), checking that Pillow can read it. A failed or timed out
+    file never leaves a partial image behind.
+    """
+    def chunks():
+        with open(source_path, 'rb') as src:
+            for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise ImageIngestError("timed out")
+                yield chunk
+
+    ext = os.path.splitext(source_path)[1]
+    name, digest = store_chunks(chunks(), kind, ext, validate=_verify_image)
+    return IngestedImage(name, digest, os.path.getsize(default_storage.path(name)))
+
+
+class _Task:
+    def __init__(self):
+        self.started = threading.Event()
+        self.deadline = None
+        self.future = None
+        self.released = False
+
+
+class ImagePipeline:
+    """
+    Bounded thread pool for the image files of an import. submit() blocks
+    once `max_pending` files are in flight, so a CSV with thousands of images
+    never queues them all at once; result() gives each file IMAGE_TIMEOUT
+    seconds from the moment a worker picks it up.
+
+        with ImagePipeline() as pipeline:
+            task = pipeline.submit('/path/to/a.jpg', 'category_images')
+            ...
+            image = pipeline.result(task)  # IngestedImage, or raises ImageIngestError
+    """
+
+    def __init__(self, workers=IMAGE_WORKERS, timeout=IMAGE_TIMEOUT, max_pending=None):
+        self.timeout = timeout
+        self.max_pending = max_pending or workers * 2
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Don't wait for files that timed out; their threads exit on their own
+        self._executor.shutdown(wait=False)
+
+    def _release(self, task):
+        with self._lock:
+            if task.released:
+                return
+            task.released = True
+        self._slots.release()
+
+    def _run(self, task, source_path, kind):
+        task.deadline = time.monotonic() + self.timeout
+        task.started.set()
+        return ingest_image(source_path, kind, task.deadline)
+
+    def submit(self, source_path, kind):
+        if not self._slots.acquire(timeout=self.timeout):
+            # Every slot is held by a stuck file; queue anyway rather than hang the import
+            logger.warning(f"Image pipeline saturated, queueing {source_path} without a slot")
+            task = _Task()
+            task.released = True
+            task.future = self._executor.submit(self._run, task, source_path, kind)
+            return task
+        task = _Task()
+        task.future = self._executor.submit(self._run, task, source_path, kind)
+        task.future.add_done_callback(lambda _: self._release(task))
+        return task
+
+    def result(self, task):
+        try:
+            # A queued file waits for at most one file per worker ahead of it
+            if not task.started.wait(self.timeout):
+                raise ImageIngestError("timed out waiting for a worker")
+            try:
+                return task.future.result(timeout=max(task.deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                raise ImageIngestError("timed out")
+            except ImageIngestError:
+                raise
+            except Exception as e:
+                raise ImageIngestError(str(e))
+        except ImageIngestError:
+            # Give the slot back even if the thread is still stuck on this file
+            self._release(task)
+            raise
@@ -0,0 +1,250 @@
+# owner/imports.py
+import csv
+import logging
+import math
+import os
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .catalog import load_catalog, merge_entries
+from .images import ImageIngestError, ImagePipeline
+from .models import Category
+
+logger = logging.getLogger(__name__)
+
+# CSV rows handled per prefetch query and bulk write
+IMPORT_CHUNK_SIZE = 2000
+
+
+
+class ImportResult:
+    def __init__(self):
+        self.success_count = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, row_number, message, failed=True):
+        if failed:
+            self.error_count += 1
+        self.errors.append(f"Row {row_number}: {message}")
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _start_image(pipeline, kind, image_path):
+    """Hand a local image file to the pipeline; None when there is nothing to copy."""
+    if not image_path or not os.path.exists(image_path):
+        return None
+    return pipeline.submit(image_path, kind)
+
+
+def _update_rows(objs, fields):
+    """
+    Write `fields` of already-saved categories with one executemany. Django's
+    bulk_update builds a CASE/WHEN per row and field, and compiling that costs
+    more than the writes for large imports.
+    """
+    if not objs:
+        return
+    qn = connection.ops.quote_name
+    columns = [Category._meta.get_field(name) for name in fields]
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        qn(Category._meta.db_table),
+        ', '.join(f'{qn(field.column)} = %s' for field in columns),
+        qn(Category._meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in columns] + [obj.pk]
+        for obj in objs
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _import_category_chunk(rows, result, pipeline):
+    """Validate one chunk of (row number, row) pairs and write it with two bulk queries."""
+    max_length = Category._meta.get_field('name').max_length
+    # Later rows for the same name win, like sequential updates would
+    parsed = {}
+    for row_number, row in rows:
+        name = row[0].strip() if len(row) > 0 else ''
+        description = row[1].strip() if len(row) > 1 else ''
+        image_path = row[2].strip() if len(row) > 2 else None
+        if not name:
+            result.error(row_number, "Category name cannot be empty")
+            continue
+        if len(name) > max_length:
+            result.error(row_number, f"Category name is longer than {max_length} characters")
+            continue
+        if name in parsed and not image_path:
+            image_path = parsed[name][2]
+        parsed[name] = (row_number, description, image_path)
+        result.success_count += 1
+
+    # Copy the chunk's images in parallel while the existing rows are fetched
+    images = {
+        name: _start_image(pipeline, 'category_images', image_path)
+        for name, (row_number, description, image_path) in parsed.items()
+    }
+    existing = Category.objects.in_bulk(list(parsed), field_name='name')
+
+    to_create, to_update, with_image = [], [], []
+    for name, (row_number, description, image_path) in parsed.items():
+        image = None
+        if images[name] is not None:
+            try:
+                image = pipeline.result(images[name]).name
+            except ImageIngestError as e:
+                result.error(row_number, f"Error with image file - {str(e)}", failed=False)
+
+        category = existing.get(name)
+        if category is None:
+            category = Category(name=name, description=description)
+            if image:
+                category.image = image
+            to_create.append(category)
+        elif image:
+            category.description = description
+            category.image = image
+            with_image.append(category)
+        elif category.description != description:
+            # Unchanged rows are counted but not rewritten
+            category.description = description
+            to_update.append(category)
+
+    Category.objects.bulk_create(to_create, batch_size=IMPORT_CHUNK_SIZE)
+    _update_rows(to_update, ['description'])
+    _update_rows(with_image, ['description', 'image'])
+
+
+def import_categories_csv(lines, has_headers=True, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import categories from CSV lines (Name, Description, Image Path), creating
+    new names and updating existing ones. The file is read in chunks; each
+    chunk costs one query to find the existing names, a bulk insert and one
+    batched update, and the whole import runs in a single transaction. Ids come from
+    the database. Rows that fail validation are reported in the result and
+    skipped.
+    """
+    result = ImportResult()
+    reader = csv.reader(lines)
+    if has_headers:
+        next(reader, None)
+
+    # Row numbers count data rows, as the import form always reported them
+    rows = (
+        (i + 1, row) for i, row in enumerate(reader)
+        if row and any(cell.strip() for cell in row)
+    )
+    with transaction.atomic(), ImagePipeline() as pipeline:
+        for chunk in _chunks(rows, chunk_size):
+            _import_category_chunk(chunk, result, pipeline)
+
+    logger.info(f"Imported {result.success_count} categories with {result.error_count} errors")
+    return result
+
+
+def _subcategory_fields(row):
+    """(category, subcategory, product name, price, description, image path) for a CSV row, or None."""
+    if len(row) >= 6:  # Full format: Category, Subcategory, Product Name, Price, Description, Image Path
+        return tuple(cell.strip() for cell in row[:5]) + (row[5].strip() or None,)
+    if len(row) >= 3:  # Minimal format: Category, Product Name, Price
+        product_name = row[1].strip()
+        # Use product name as subcategory name
+        return row[0].strip(), product_name, product_name, row[2].strip(), '', None
+    return None
+
+
+def import_subcategories_csv(lines, email, has_headers=True, progress=None):
+    """
+    Import an owner's subcategory entries from CSV lines into the catalog
+    document. Existing entries (same category and product name) are updated,
+    others appended. Rows are read and images copied without holding the
+    catalog lock; the entries are then merged into the latest document in one
+    save, so edits made during the import are kept. `progress`, if given, is
+    called as progress(rows_processed, result) before every row and with
+    force=True once all rows are read.
+    """
+    result = ImportResult()
+    reader = csv.reader(lines)
+    if has_headers:
+        next(reader, None)
+
+    # Ids of the entries rows match now, so they still match if renamed meanwhile
+    ids = {}
+    for category, entries in load_catalog()['user_data'].get(email, {}).get("subcategories", {}).items():
+        for sc in entries:
+            if "id" in sc:
+                ids.setdefault((category, sc["name"]), sc["id"])
+
+    # One entry per (category, name); later rows win, as sequential updates would
+    imported = {}
+    processed = 0
+    pending_images = []
+    with ImagePipeline() as pipeline:
+        for i, row in enumerate(reader):
+            processed = i + 1
+            if progress:
+                progress(processed, result)
+            if not row or all(cell.strip() == '' for cell in row):  # Skip empty rows
+                continue
+
+            fields = _subcategory_fields(row)
+            if fields is None:
+                result.error(i + 1, "Invalid format - needs at least 3 columns")
+                continue
+            category, subcategory_name, product_name, price, description, image_path = fields
+            if not category or not product_name or not price:
+                result.error(i + 1, "Category, Product Name, and Price are required")
+                continue
+
+            try:
+                price_value = float(price)
+            except ValueError:
+                price_value = None
+            if price_value is None or not math.isfinite(price_value) or price_value < 0:
+                result.error(i + 1, f"Invalid price '{price}'")
+                continue
+
+            # Only rows that passed validation are recorded
+            key = (category, product_name)
+            entry = imported.setdefault(key, {
+                "category": category,
+                "name": product_name,
+                "fields": {},
+                "defaults": {"image": "/media/products/default.png", "rating": 0},
+            })
+            if key in ids:
+                entry["id"] = ids[key]
+            entry["fields"].update(subcategory=subcategory_name, price=price_value, description=description)
+            # Images are copied by the pipeline while the rows are read
+            if image_path and os.path.exists(image_path):
+                pending_images.append((i + 1, entry, pipeline.submit(image_path, 'products')))
+            result.success_count += 1
+
+        for row_number, entry, task in pending_images:
+            try:
+                entry["fields"]["image"] = pipeline.result(task).url
+            except ImageIngestError as e:
+                result.error(row_number, f"Error copying image file - {str(e)}", failed=False)
+
+    if progress:
+        progress(processed, result, force=True)
+    if imported:
+        merge_entries(email, list(imported.values()))
+    return result
+
+
+def status_message(result, noun):
+    if result.error_count == 0:
+        return f'Successfully imported {result.success_count} {noun}.'
+    return f'Imported {result.success_count} {noun} with {result.error_count} errors.'
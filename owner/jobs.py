@@ -0,0 +1,158 @@
+# owner/jobs.py
+import csv
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .imports import import_subcategories_csv, status_message
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# Background imports run on a small in-process pool instead of a broker
+IMPORT_WORKERS = getattr(settings, 'IMPORT_WORKERS', 2)
+
+# Progress is written to the job row at most this often
+PROGRESS_INTERVAL = 0.5
+
+# A job still running this long after it started belonged to a worker that died
+STALE_JOB_SECONDS = getattr(settings, 'IMPORT_JOB_TIMEOUT', 60 * 60)
+
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), 'taskpro-imports')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix='import')
+        return _executor
+
+
+def enqueue_subcategory_import(email, uploaded_file, has_headers=True):
+    """Store the upload outside the request, queue an ImportJob for it and return the job."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.csv', prefix='subcategories-', dir=UPLOAD_DIR)
+    with os.fdopen(fd, 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+
+    job = ImportJob.objects.create(owner_email=email, upload_path=path, has_headers=has_headers)
+    # Only hand the job to a worker once its row is visible to other connections
+    transaction.on_commit(lambda: _get_executor().submit(run_import_job, job.pk))
+    return job
+
+
+class _Progress:
+    """Writes rows processed and error counts to the job row, throttled."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.last = 0
+
+    def __call__(self, processed, result, force=False):
+        now = time.monotonic()
+        if not force and now - self.last < PROGRESS_INTERVAL:
+            return
+        self.last = now
+        ImportJob.objects.filter(pk=self.job_id).update(
+            processed_rows=processed,
+            success_count=result.success_count,
+            error_count=result.error_count,
+        )
+
+
+def _count_rows(path, has_headers):
+    with open(path, newline='', encoding='utf-8') as f:
+        total = sum(1 for _ in csv.reader(f))
+    return max(total - 1, 0) if has_headers else total
+
+
+def run_import_job(job_id):
+    """Run a queued job to completion. Returns False if another worker already claimed it."""
+    close_old_connections()
+    try:
+        # Claim the job so the pool and run_import_jobs never run it twice
+        claimed = ImportJob.objects.filter(pk=job_id, status=ImportJob.QUEUED).update(
+            status=ImportJob.RUNNING, started_at=timezone.now(),
+        )
+        if not claimed:
+            return False
+        job = ImportJob.objects.get(pk=job_id)
+        try:
+            job.total_rows = _count_rows(job.upload_path, job.has_headers)
+            ImportJob.objects.filter(pk=job_id).update(total_rows=job.total_rows)
+
+            progress = _Progress(job_id)
+            with open(job.upload_path, newline='', encoding='utf-8') as f:
+                result = import_subcategories_csv(f, job.owner_email, job.has_headers, progress=progress)
+
+            job.status = ImportJob.DONE
+            job.processed_rows = job.total_rows
+            job.success_count = result.success_count
+            job.error_count = result.error_count
+            job.errors = result.errors[:100]
+            job.message = status_message(result, 'subcategories')
+        except Exception as e:
+            logger.exception(f"Import job {job_id} failed")
+            job.status = ImportJob.FAILED
+            job.message = f'Error processing CSV file: {str(e)}'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'processed_rows', 'success_count', 'error_count',
+                                'errors', 'message', 'finished_at'])
+        try:
+            os.remove(job.upload_path)
+        except OSError:
+            pass
+        return True
+    finally:
+        close_old_connections()
+
+
+def requeue_stale_jobs():
+    """
+    Put jobs left RUNNING by a worker that died (a web process restart, say)
+    back in the queue. Importing a file again is safe: rows update the
+    entries they created the first time. Returns how many were requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=STALE_JOB_SECONDS)
+    count = ImportJob.objects.filter(status=ImportJob.RUNNING).filter(
+        Q(started_at__lt=cutoff) | Q(started_at__isnull=True)
+    ).update(status=ImportJob.QUEUED, started_at=None)
+    if count:
+        logger.warning(f"Requeued {count} import jobs left running by a stopped worker")
+    return count
+
+
+def run_pending_jobs():
+    """Requeue stale jobs, then run every queued job in this process, oldest first; returns how many ran."""
+    requeue_stale_jobs()
+    pending = ImportJob.objects.filter(status=ImportJob.QUEUED).order_by('created_at').values_list('pk', flat=True)
+    return sum(1 for job_id in list(pending) if run_import_job(job_id))
+
+
+def job_status(job):
+    """JSON-ready progress of a job, for the polling endpoint."""
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'done': job.status in (ImportJob.DONE, ImportJob.FAILED),
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'success_count': job.success_count,
+        'error_count': job.error_count,
+        'errors': job.errors[:10],
+        'message': job.message,
+    }
@@ -0,0 +1,244 @@
+# owner/media.py
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Files changed this recently are never released: a concurrent upload of the
+# same content may be about to reference them
+RELEASE_GRACE_SECONDS = 300
+
+DEFAULT_IMAGES = ('/default.png', '/no-image.png')
+
+
+def content_name(kind, digest, ext):
+    """Storage name for content: `<kind>/ab/cd/abcd....ext`, sharded on the hash."""
+    return f"{kind}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def media_url(name):
+    return f"{settings.MEDIA_URL}{name}"
+
+
+def media_name(url):
+    """Storage name for a /media/ URL or name, or None for anything outside MEDIA_ROOT."""
+    if not url:
+        return None
+    if url.startswith(settings.MEDIA_URL):
+        return url[len(settings.MEDIA_URL):]
+    if url.startswith('/'):
+        return None
+    return url
+
+
+def store_chunks(chunks, kind, ext, validate=None):
+    """
+    Write `chunks` under MEDIA_ROOT named by their sha256 and return
+    (name, digest). Identical content maps to the same file, so storing it
+    again costs no extra bytes. `validate(temp_path)` may raise to reject the
+    file before it is published.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, kind)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=directory)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+        if validate:
+            validate(temp_path)
+
+        name = content_name(kind, digest.hexdigest(), ext)
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if os.path.exists(path):
+            # Duplicate: keep the stored copy, and mark it as just referenced
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(temp_path, 0o644)
+            # Atomic; a concurrent store of the same content writes the same bytes
+            os.replace(temp_path, path)
+        return name, digest.hexdigest()
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def store_upload(uploaded_file, kind='products'):
+    """Store an uploaded file by content and return its /media/ URL."""
+    ext = os.path.splitext(uploaded_file.name)[1]
+    name, _ = store_chunks(uploaded_file.chunks(), kind, ext)
+    return media_url(name)
+
+
+def reference_count(name):
+    """
+    How many things point at a stored file: FileField rows of every model,
+    JSON fields (order snapshots) holding its URL, owner profile pictures,
+    and the catalog document. Counts the same references as referenced_media.
+    """
+    from django.apps import apps
+    from django.db import models
+    from django.db.models.functions import Cast
+
+    from .catalog import load_catalog
+    from .models import Owner
+
+    url = media_url(name)
+    count = Owner.objects.filter(profile_picture=url).count()
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                count += model._default_manager.filter(**{field.name: name}).count()
+            elif isinstance(field, models.JSONField):
+                count += (
+                    model._default_manager
+                    .annotate(_media_text=Cast(field.name, models.TextField()))
+                    .filter(_media_text__contains=url)
+                    .count()
+                )
+
+    names = set()
+    _collect_urls(load_catalog(), names)
+    if name in names:
+        count += 1
+    return count
+
+
+def release_media(url):
+    """
+    Drop a reference to a stored file: it is deleted once nothing points at
+    it any more (see reference_count). Call this after the change that
+    removed the reference has been saved. Returns True if the file was
+    deleted.
+    """
+    name = media_name(url)
+    if not name or any(default in url for default in DEFAULT_IMAGES):
+        return False
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        if time.time() - os.path.getmtime(path) < RELEASE_GRACE_SECONDS:
+            return False
+        if reference_count(name):
+            return False
+        os.remove(path)
+    except OSError:
+        return False
+    from .thumbnails import delete_thumbnails
+    delete_thumbnails(name)
+    logger.info(f"Deleted unreferenced media file {name}")
+    return True
+
+
+# Files the code falls back to by URL; nothing stores a reference to them
+BUILTIN_MEDIA = {'products/default.png', 'profiles/default.png'}
+
+
+def _collect_urls(value, names):
+    """Add the storage name of every /media/ URL found in a JSON-like value."""
+    if isinstance(value, str):
+        if value.startswith(settings.MEDIA_URL):
+            names.add(value[len(settings.MEDIA_URL):])
+    elif isinstance(value, dict):
+        for item in value.values():
+            _collect_urls(item, names)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _collect_urls(item, names)
+
+
+def referenced_media(chunk_size=2000):
+    """
+    Storage names of every file something points at: /media/ URLs anywhere
+    in the catalog document, every FileField of every model, JSON fields
+    (order snapshots) and owner profile pictures.
+    """
+    from django.apps import apps
+    from django.db import models
+
+    from .catalog import load_catalog
+
+    names = set(BUILTIN_MEDIA)
+    _collect_urls(load_catalog(), names)
+
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                values = model._default_manager.exclude(**{field.name: ''}).values_list(field.name, flat=True)
+                for value in values.iterator(chunk_size=chunk_size):
+                    name = media_name(value)
+                    if name:
+                        names.add(name)
+            elif isinstance(field, models.JSONField):
+                values = model._default_manager.values_list(field.name, flat=True)
+                for value in values.iterator(chunk_size=chunk_size):
+                    _collect_urls(value, names)
+
+    from .models import Owner
+    for url in Owner.objects.values_list('profile_picture', flat=True).iterator(chunk_size=chunk_size):
+        name = media_name(url)
+        if name:
+            names.add(name)
+    return names
+
+
+def _walk(directory, prefix=''):
+    """Yield (storage name, DirEntry) for every file below `directory`, using os.scandir."""
+    stack = [(directory, prefix)]
+    while stack:
+        path, prefix = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, f"{prefix}{entry.name}/"))
+                    elif entry.is_file(follow_symlinks=False):
+                        yield f"{prefix}{entry.name}", entry
+        except OSError:
+            logger.warning(f"Cannot scan {path}")
+
+
+def iter_orphans(referenced, min_age=RELEASE_GRACE_SECONDS):
+    """
+    Yield (storage name, path, size) for files under MEDIA_ROOT that nothing
+    references. Thumbnails count as referenced while their original is, and
+    files newer than `min_age` seconds are skipped as possibly in flight.
+    """
+    from .thumbnails import THUMBNAIL_DIR, parse_thumbnail_path
+
+    cutoff = time.time() - min_age
+    for name, entry in _walk(str(settings.MEDIA_ROOT)):
+        if name in referenced:
+            continue
+        if name.startswith(THUMBNAIL_DIR + '/'):
+            parsed = parse_thumbnail_path(name[len(THUMBNAIL_DIR) + 1:])
+            if parsed and parsed[0] in referenced:
+                continue
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if st.st_mtime > cutoff:
+            continue
+        yield name, entry.path, st.st_size
+
+
+def prune_empty_dirs(root=None):
+    """Remove empty directories below MEDIA_ROOT (never MEDIA_ROOT itself)."""
+    root = str(root or settings.MEDIA_ROOT)
+    removed = 0
+    for path, dirs, files in os.walk(root, topdown=False):
+        if path != root and not os.listdir(path):
+            try:
+                os.rmdir(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owner', '0010_importjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['image'], name='owner_produ_image_6b8656_idx'),
+        ),
+    ]
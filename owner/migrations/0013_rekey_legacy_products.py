@@ -0,0 +1,58 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:30
+
+from django.core.management.color import no_style
+from django.db import migrations
+
+
+def rekey_legacy_products(apps, schema_editor):
+    """
+    Product rows from before the catalog tables have no owner and an
+    auto-increment id, which may be the data.json id of another product.
+    Give each the data.json id of the entry with its name, so the next sync
+    updates it in place, and move the rest above every id data.json uses.
+    """
+    from owner.catalog import load_catalog
+
+    Product = apps.get_model('owner', 'Product')
+    legacy = list(Product.objects.filter(owner__isnull=True).order_by('id').values_list('id', 'name'))
+    if not legacy:
+        return
+
+    ids_by_name = {}
+    data = load_catalog()
+    for udata in data.get("user_data", {}).values():
+        sections = list(udata.get("subcategories", {}).values()) + [udata.get("products", [])]
+        for entries in sections:
+            for p in entries:
+                if "id" in p and p.get("name"):
+                    ids_by_name.setdefault(p["name"], []).append(p["id"])
+    data_ids = [pid for ids in ids_by_name.values() for pid in ids]
+
+    # Out of the way first, so re-keyed rows never clash with each other
+    top = max([data.get("last_product_id", 0)] + data_ids + list(Product.objects.values_list('id', flat=True)))
+    moved = []
+    for offset, (old_id, name) in enumerate(legacy, start=1):
+        Product.objects.filter(id=old_id).update(id=top + offset)
+        moved.append((top + offset, name))
+
+    taken = set(Product.objects.filter(owner__isnull=False).values_list('id', flat=True))
+    for row_id, name in moved:
+        new_id = next((pid for pid in ids_by_name.get(name, []) if pid not in taken), None)
+        if new_id is not None:
+            Product.objects.filter(id=row_id).update(id=new_id)
+            taken.add(new_id)
+
+    with schema_editor.connection.cursor() as cursor:
+        for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), [Product]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('owner', '0012_importjob_started_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_legacy_products, migrations.RunPython.noop),
+    ]
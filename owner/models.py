@@ -27,6 +27,16 @@ class SubCategory(models.Model):
             return self.image.url
         return '/static/images/no-image.png'
 
+class Owner(models.Model):
+    """A store owner, mirrored from data.json["users"]."""
+    email = models.CharField(max_length=254, unique=True)
+    username = models.CharField(max_length=150, blank=True)
+    password = models.CharField(max_length=128, blank=True)
+    profile_picture = models.CharField(max_length=255, default='/media/profiles/default.png')
+
+    def __str__(self):
+        return self.email
+
 class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -38,6 +48,19 @@ class Product(models.Model):
         null=True,
         blank=True
     )
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='products', null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products', null=True, blank=True)
+    description = models.TextField(blank=True)
+    rating = models.IntegerField(null=True, blank=True)
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'category', 'name']),
+            models.Index(fields=['name']),
+            # Reference counts for shared media files (owner.media)
+            models.Index(fields=['image']),
+        ]
 
     @property
     def image_path(self):
@@ -48,7 +71,41 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
+class CatalogRevision(models.Model):
+    """Single-row counter bumped whenever the catalog tables change."""
+    revision = models.PositiveIntegerField(default=0)
 
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('revision', flat=True).first() or 0
 
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(revision=models.F('revision') + 1):
+            cls.objects.get_or_create(pk=1, defaults={'revision': 1})
 
+class ImportJob(models.Model):
+    """A CSV upload queued for background import, with its progress."""
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(s, s) for s in (QUEUED, RUNNING, DONE, FAILED)]
 
+    owner_email = models.CharField(max_length=254)
+    kind = models.CharField(max_length=30, default='subcategories')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    upload_path = models.CharField(max_length=500)
+    has_headers = models.BooleanField(default=True)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    success_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} import #{self.pk} ({self.status})"
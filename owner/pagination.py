@@ -0,0 +1,167 @@
+# owner/pagination.py
+import base64
+import json
+import logging
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (datetime, pk) for a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+# Below this many rows an exact COUNT(*) is cheap, and an estimate may be far off
+EXACT_COUNT_BELOW = 1000
+
+
+def estimate_count(queryset):
+    """
+    (row count, whether it is an estimate) for a queryset. On MySQL and
+    PostgreSQL large counts are taken from the planner's estimate, so large
+    lists don't pay for a COUNT(*) on every page; small tables and other
+    databases are counted exactly.
+    """
+    queryset = queryset.order_by().values('pk')
+    connection = connections[queryset.db]
+    estimate = None
+    try:
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('EXPLAIN ' + sql, params)
+                columns = [col[0] for col in cursor.description]
+                row = cursor.fetchone()
+                estimate = int(row[columns.index('rows')] or 0)
+            elif connection.vendor == 'postgresql':
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                estimate = int(plan[0]['Plan']['Plan Rows'])
+    except Exception:
+        logger.exception("Could not estimate row count, counting instead")
+    if estimate is not None and estimate >= EXACT_COUNT_BELOW:
+        return estimate, True
+    return queryset.count(), False
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over `queryset` ordered newest first by (field, id).
+    Each page is one indexed range query, however deep it is, instead of an
+    OFFSET scan; there is no page count, only next/previous cursors.
+    """
+
+    def __init__(self, queryset, per_page, field, estimate=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.estimate = estimate
+        self._count = None
+        self._count_is_estimate = False
+
+    @property
+    def count(self):
+        if self._count is None:
+            if self.estimate:
+                self._count, self._count_is_estimate = estimate_count(self.queryset)
+            else:
+                self._count = self.queryset.count()
+        return self._count
+
+    @property
+    def count_is_estimate(self):
+        """True only when `count` came from the planner rather than COUNT(*)."""
+        self.count
+        return self._count_is_estimate
+
+    def get_page(self, after=None, before=None):
+        field = self.field
+        if before and decode_cursor(before):
+            value, pk = decode_cursor(before)
+            rows = list(
+                self.queryset
+                .filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+                .order_by(field, 'pk')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            position = decode_cursor(after) if after else None
+            queryset = self.queryset
+            if position:
+                value, pk = position
+                queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+            rows = list(queryset.order_by(f'-{field}', '-pk')[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = position is not None
+        return CursorPage(rows, self, has_next and bool(rows), has_previous and bool(rows))
+
+
+class CursorPage:
+    """Quacks like a Django Page for templates; links use next_cursor/previous_cursor."""
+    is_cursor = True
+    number = None
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.paginator.field), obj.pk)
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1]) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0]) if self._has_previous else None
+
+
+def paginate(request, queryset, field, per_page=10):
+    """
+    Page through `queryset` newest first. `?page=N` keeps the numbered
+    OFFSET pagination (with an exact count); otherwise pages are keyset
+    based on (field, id), navigated with `?after=` / `?before=` cursors.
+    """
+    page_number = request.GET.get('page')
+    if page_number:
+        return Paginator(queryset.order_by(f'-{field}', '-pk'), per_page).get_page(page_number)
+    paginator = CursorPaginator(queryset, per_page, field)
+    return paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
@@ -0,0 +1,197 @@
+# owner/search.py
+import re
+import threading
+from bisect import bisect_left
+
+from .catalog import get_catalog
+from .thumbnails import THUMBNAIL_WIDTHS, thumbnail_url
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Matches in earlier fields rank higher
+FIELD_WEIGHTS = (
+    ("name", 8),
+    ("category", 4),
+    ("subcategory", 4),
+    ("owner_name", 2),
+    ("description", 1),
+)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class SearchIndex:
+    """
+    Inverted index over catalog products. Every token of the indexed fields
+    maps to {product id: best field weight}; the vocabulary is kept sorted so
+    a query term also matches every token it is a prefix of. A query costs a
+    binary search per term plus the postings it matches.
+    """
+
+    def __init__(self, products, owner_names=None):
+        owner_names = owner_names or {}
+        self.products = {}
+        postings = {}
+        for product in products:
+            pid = product["id"]
+            self.products[pid] = product
+            fields = dict(product, owner_name=owner_names.get(product["owner"], ""))
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(fields.get(field)):
+                    entry = postings.setdefault(token, {})
+                    if entry.get(pid, 0) < weight:
+                        entry[pid] = weight
+        self.postings = postings
+        self.tokens = sorted(postings)
+
+    def _term_scores(self, term):
+        """Best weight per product over the tokens starting with `term`; whole-token matches count double."""
+        scores = {}
+        tokens = self.tokens
+        i = bisect_left(tokens, term)
+        while i < len(tokens) and tokens[i].startswith(term):
+            factor = 2 if tokens[i] == term else 1
+            for pid, weight in self.postings[tokens[i]].items():
+                if weight * factor > scores.get(pid, 0):
+                    scores[pid] = weight * factor
+            i += 1
+        return scores
+
+    def search(self, query, owner=None, limit=None):
+        """Products matching every term of `query`, best first."""
+        result = None
+        # Longer terms usually match fewer postings, so intersect from them
+        for term in sorted(set(tokenize(query)), key=len, reverse=True):
+            scores = self._term_scores(term)
+            if result is None:
+                result = scores
+            else:
+                result = {pid: result[pid] + score for pid, score in scores.items() if pid in result}
+            if not result:
+                return []
+        if not result:
+            return []
+
+        products = [self.products[pid] for pid in result]
+        if owner is not None:
+            products = [p for p in products if p["owner"] == owner]
+        products.sort(key=lambda p: (-result[p["id"]], p["name"].lower(), p["id"]))
+        return products[:limit] if limit else products
+
+
+class TypeaheadIndex:
+    """
+    Sorted arrays for autocomplete. Name keys are (key, rank, product id)
+    for each product's full name and every later word of it; group keys are
+    (key, product ids) for each distinct category and subcategory name,
+    listing its products in result order. A prefix query is a binary search
+    and a short scan of each, names first, so a big category can never crowd
+    name matches out of the scan. Display fields are joined once at build
+    time.
+    """
+
+    # Ranks: whole-name prefix, word-in-name prefix, category/subcategory prefix
+    NAME, WORD, CATEGORY = 0, 1, 2
+
+    # Upper bound on keys scanned per array and query, to keep very short prefixes cheap
+    MAX_SCAN = 500
+
+    def __init__(self, products):
+        self.results = {}
+        entries = []
+        groups = {}
+        for product in products:
+            pid = product["id"]
+            self.results[pid] = {
+                'id': pid,
+                'name': product["name"],
+                'category': product.get("category") or 'N/A',
+                'subcategory': product.get("subcategory") or 'N/A',
+                'price': f'{product["price"]:.2f}',
+                'description': product["name"],
+                'image_path': product["image_path"],
+                'image': thumbnail_url(product["image_path"], THUMBNAIL_WIDTHS[0]),
+            }
+            name = product["name"].lower().strip()
+            entries.append((name, self.NAME, pid))
+            for word in tokenize(name)[1:]:
+                entries.append((word, self.WORD, pid))
+            for field in ("category", "subcategory"):
+                if product.get(field):
+                    groups.setdefault(product[field].lower(), set()).add(pid)
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+        self.group_keys = sorted(groups)
+        self.groups = [sorted(groups[key], key=self._order) for key in self.group_keys]
+
+    def _order(self, pid):
+        return self.results[pid]['name'].lower(), pid
+
+    def complete(self, prefix, limit=10):
+        """Top `limit` products for a prefix: name matches before category matches, then by name."""
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        best = {}
+        start = bisect_left(self.keys, prefix)
+        for key, rank, pid in self.entries[start:start + self.MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            if rank < best.get(pid, self.CATEGORY + 1):
+                best[pid] = rank
+
+        if len(best) < limit:
+            # Each group is already in result order, so its first `limit` new products are enough
+            start = bisect_left(self.group_keys, prefix)
+            for i in range(start, min(start + self.MAX_SCAN, len(self.group_keys))):
+                if not self.group_keys[i].startswith(prefix):
+                    break
+                taken = 0
+                for pid in self.groups[i]:
+                    if pid not in best:
+                        best[pid] = self.CATEGORY
+                        taken += 1
+                        if taken == limit:
+                            break
+
+        ranked = sorted(best, key=lambda pid: (best[pid],) + self._order(pid))
+        return [self.results[pid] for pid in ranked[:limit]]
+
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+def _catalog_index(name, build):
+    """Return build(catalog) for the current catalog, rebuilt whenever the catalog is."""
+    catalog = get_catalog()
+    cached = _indexes.get(name)
+    if cached is not None and cached[0] is catalog:
+        return cached[1]
+    with _lock:
+        cached = _indexes.get(name)
+        if cached is None or cached[0] is not catalog:
+            cached = (catalog, build(catalog))
+            _indexes[name] = cached
+        return cached[1]
+
+
+def _build_search_index(catalog):
+    from .models import Owner
+
+    owner_names = dict(Owner.objects.values_list('email', 'username'))
+    return SearchIndex(catalog.by_id.values(), owner_names)
+
+
+def get_search_index():
+    """The SearchIndex for the current catalog."""
+    return _catalog_index("search", _build_search_index)
+
+
+def get_typeahead_index():
+    """The TypeaheadIndex for the current catalog."""
+    return _catalog_index("typeahead", lambda catalog: TypeaheadIndex(catalog.by_id.values()))
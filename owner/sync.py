@@ -0,0 +1,199 @@
+# owner/sync.py
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Owner, Category, SubCategory, Product, CatalogRevision
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+PRODUCT_FIELDS = ['owner_id', 'name', 'category_id', 'price', 'image', 'subcategory_id', 'description', 'rating', 'quantity']
+
+
+def _image_name(path):
+    """data.json stores '/media/products/x.jpg', the ImageField stores 'products/x.jpg'."""
+    if path and path.startswith('/media/'):
+        return path[len('/media/'):]
+    return path or ''
+
+
+def _iter_products(udata):
+    """Yield (category, product dict, image path) for every product an owner lists."""
+    for cat, items in udata.get("subcategories", {}).items():
+        for p in items:
+            yield p.get("category", cat), p, p.get("image", "/media/products/default.png")
+    for p in udata.get("products", []):
+        yield p.get("category", ""), p, p.get("image_path", "/media/products/default.png")
+
+
+def _batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _claim_ids(names, existing, batch_size):
+    """
+    Make the ids in `names` ({id: product name}) that no synced owner holds
+    yet usable for their products. A row of another owner with one of them
+    is the same product moved between owners, and a row without an owner
+    and the same name is one migration 0013 re-keyed: both are added to
+    `existing` and updated in place. Any other row with a wanted id is a
+    different product; it is moved to a free id rather than deleted.
+    """
+    missing = [key for key in names if key not in existing]
+    strangers = []
+    for batch in _batched(missing, batch_size):
+        for product in Product.objects.filter(id__in=batch):
+            if product.owner_id is None and product.name != names[product.id]:
+                strangers.append(product.id)
+            else:
+                existing[product.id] = product
+    if strangers:
+        next_id = max(Product.objects.aggregate(top=Max('id'))['top'] or 0, max(names)) + 1
+        for old_id in strangers:
+            Product.objects.filter(id=old_id).update(id=next_id)
+            logger.warning(f"Moved product row {old_id} to id {next_id}; data.json uses its id")
+            next_id += 1
+
+
+def sync_catalog(data, emails=None, batch_size=BATCH_SIZE, product_ids=None):
+    """
+    Mirror owners and their products from a data.json document into the
+    catalog tables. Only the given owner emails are synced (all owners when
+    None); owners listed in `emails` but missing from `data` are removed.
+    Products are keyed by their data.json "id", which becomes the row's
+    primary key; entries without an id are skipped (see assign_product_ids).
+    The sync is idempotent and uses bulk queries per batch, so re-running it
+    on an unchanged document only issues reads. With `product_ids`, only
+    those products are synced (and deleted if no longer listed), for edits
+    that touch a few entries.
+    """
+    users = data.get("users", {})
+    user_data = data.get("user_data", {})
+    if emails is None:
+        emails = set(users) | set(user_data)
+        stale_owners = Owner.objects.exclude(email__in=list(emails))
+    else:
+        emails = set(emails)
+        stale_owners = Owner.objects.filter(email__in=[e for e in emails if e not in users and e not in user_data])
+    # Keep data.json order so owners (and the storefront listing) come out in the same order
+    present = [e for e in dict.fromkeys(list(user_data) + list(users)) if e in emails]
+
+    stats = {"owners": 0, "created": 0, "updated": 0, "deleted": 0}
+
+    with transaction.atomic():
+        _, removed_rows = stale_owners.delete()
+        stats["deleted"] += removed_rows.get('owner.Product', 0)
+
+        # -- Owners
+        owners = {o.email: o for o in Owner.objects.filter(email__in=present)}
+        new_owners, changed_owners = [], []
+        for email in present:
+            info = users.get(email, {})
+            fields = {
+                "username": info.get("username", ""),
+                "password": info.get("password", ""),
+                "profile_picture": info.get("profile_picture", "/media/profiles/default.png"),
+            }
+            owner = owners.get(email)
+            if owner is None:
+                new_owners.append(Owner(email=email, **fields))
+            elif any(getattr(owner, k) != v for k, v in fields.items()):
+                for k, v in fields.items():
+                    setattr(owner, k, v)
+                changed_owners.append(owner)
+        Owner.objects.bulk_create(new_owners, batch_size=batch_size)
+        Owner.objects.bulk_update(changed_owners, ["username", "password", "profile_picture"], batch_size=batch_size)
+        owners = {o.email: o for o in Owner.objects.filter(email__in=present)}
+        stats["owners"] = len(owners)
+
+        # -- Categories and subcategories referenced by these owners
+        rows = []
+        seen = set()
+        for email in present:
+            for category, p, image in _iter_products(user_data.get(email, {})):
+                if not p.get("name") or "id" not in p or p["id"] in seen:
+                    continue
+                if product_ids is not None and p["id"] not in product_ids:
+                    continue
+                seen.add(p["id"])
+                rows.append((email, category, p.get("subcategory") or "", p, image))
+
+        category_names = {r[1] for r in rows if r[1]}
+        categories = {c.name: c for c in Category.objects.filter(name__in=category_names)}
+        Category.objects.bulk_create(
+            [Category(name=n, description=f'Category for {n}') for n in category_names if n not in categories],
+            batch_size=batch_size,
+        )
+        categories = {c.name: c for c in Category.objects.filter(name__in=category_names)}
+
+        subcategories = {}
+        for sub in SubCategory.objects.filter(category__in=categories.values()).order_by('id'):
+            subcategories.setdefault((sub.category_id, sub.name), sub)
+        missing = {(categories[r[1]].id, r[2]) for r in rows if r[1] and r[2]} - set(subcategories)
+        SubCategory.objects.bulk_create(
+            [SubCategory(category_id=cat_id, name=name) for cat_id, name in missing],
+            batch_size=batch_size,
+        )
+        if missing:
+            for sub in SubCategory.objects.filter(category__in=categories.values()).order_by('id'):
+                subcategories.setdefault((sub.category_id, sub.name), sub)
+
+        # products[] entries may name a subcategory without a category; link
+        # them to an existing subcategory of that name
+        loose = {r[2] for r in rows if not r[1] and r[2]}
+        for sub in SubCategory.objects.filter(name__in=loose).order_by('id'):
+            subcategories.setdefault((None, sub.name), sub)
+
+        # -- Products, keyed by their data.json id
+        existing = Product.objects.filter(owner__in=owners.values())
+        if product_ids is not None:
+            existing = existing.filter(id__in=list(product_ids))
+        existing = {product.id: product for product in existing}
+        _claim_ids({r[3]["id"]: r[3]["name"] for r in rows}, existing, batch_size)
+
+        new_products, changed_products = [], []
+        wanted = set()
+        for email, category, sub_name, p, image in rows:
+            owner = owners[email]
+            cat_id = categories[category].id if category else None
+            key = p["id"]
+            wanted.add(key)
+            sub = subcategories.get((cat_id, sub_name))
+            fields = {
+                "owner_id": owner.id,
+                "name": p["name"],
+                "category_id": cat_id,
+                "price": Decimal(str(p.get("price", 0) or 0)).quantize(Decimal("0.01")),
+                "image": _image_name(image),
+                "subcategory_id": sub.id if sub else None,
+                "description": p.get("description", "") or "",
+                "rating": p.get("rating"),
+                "quantity": max(0, int(p.get("quantity", 1) or 0)),
+            }
+            product = existing.get(key)
+            if product is None:
+                new_products.append(Product(id=key, **fields))
+            elif any(getattr(product, k) != v for k, v in fields.items()):
+                for k, v in fields.items():
+                    setattr(product, k, v)
+                changed_products.append(product)
+
+        Product.objects.bulk_create(new_products, batch_size=batch_size)
+        Product.objects.bulk_update(changed_products, PRODUCT_FIELDS, batch_size=batch_size)
+        stats["created"] += len(new_products)
+        stats["updated"] += len(changed_products)
+
+        removed = [key for key in existing if key not in wanted]
+        for batch in _batched(removed, batch_size):
+            Product.objects.filter(id__in=batch).delete()
+        stats["deleted"] += len(removed)
+
+        if new_products or changed_products or removed or new_owners or changed_owners or removed_rows:
+            CatalogRevision.bump()
+
+    return stats
@@ -1,3 +1,528 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalog
+from .catalog import catalog_lock, get_catalog, invalidate_catalog, load_catalog, save_catalog
+from .imports import import_subcategories_csv
+from .jobs import run_pending_jobs
+from .media import media_url, release_media, store_chunks
+from .models import Category, ImportJob, Product
+from .pagination import CursorPaginator
+from .search import TypeaheadIndex
+from .thumbnails import thumbnail_name
+
+OWNER = 'owner@example.com'
+
+
+def owner_data(*products, category='mens'):
+    return {
+        "categories": [category],
+        "subcategories": {category: list(products)},
+        "products": [],
+    }
+
+
+def product_entry(name, pid=None, **fields):
+    entry = {"name": name, "subcategory": "shirts", "price": 100.0, "description": "",
+             "image": "/media/products/default.png", "category": "mens", "rating": 0, "quantity": 1}
+    if pid is not None:
+        entry["id"] = pid
+    entry.update(fields)
+    return entry
+
+
+class CatalogFileTestCase(TestCase):
+    """Points data.json, its lock and its journal at a temporary directory."""
+
+    def setUp(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.data_file = directory / 'data.json'
+        for target, path in (
+            ('owner.catalog.DATA_FILE', self.data_file),
+            ('owner.catalog.LOCK_FILE', directory / 'data.json.lock'),
+            ('owner.catalog.JOURNAL_FILE', directory / 'data.journal.jsonl'),
+            ('owner.views.DATA_FILE', self.data_file),
+        ):
+            patcher = mock.patch(target, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        invalidate_catalog()
+        self.addCleanup(invalidate_catalog)
+
+    def write_catalog(self, user_data, users=None):
+        users = users or {email: {"username": email.split('@')[0], "password": "pw"} for email in user_data}
+        save_catalog({"users": users, "user_data": user_data})
+
+    def read_file(self):
+        with open(self.data_file, encoding='utf-8') as f:
+            return json.load(f)
+
+
+class EditProductTests(CatalogFileTestCase):
+    def test_edit_keeps_product_id_and_row(self):
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1, rating=4), product_entry("Tie", 2))})
+        session = self.client.session
+        session['email'] = OWNER
+        session.save()
+
+        self.client.post(reverse('edit_subcategory', args=['mens', 'Shirt']), {
+            'category': 'mens', 'subcategory': 'shirts', 'name': 'Blue Shirt', 'price': '120',
+            'description': 'Renamed',
+        })
+
+        entry = next(p for p in load_catalog()["user_data"][OWNER]["subcategories"]["mens"] if p["name"] == "Blue Shirt")
+        self.assertEqual((entry["id"], entry["name"], entry["rating"]), (1, "Blue Shirt", 4))
+        product = Product.objects.get(pk=1)
+        self.assertEqual(product.name, "Blue Shirt")
+        self.assertEqual(Product.objects.count(), 2)
+
+
+class EditProductByIdTests(CatalogFileTestCase):
+    def setUp(self):
+        super().setUp()
+        data = owner_data(product_entry("Shirt", 1), product_entry("Tie", 2))
+        data["subcategories"]["womens"] = [product_entry("Shirt", 3, category="womens")]
+        data["products"] = [{"id": 4, "name": "Shirt", "subcategory": "shirts", "price": 100.0,
+                             "image_path": "/media/products/default.png", "category": "womens"}]
+        self.write_catalog({OWNER: data})
+        session = self.client.session
+        session['email'] = OWNER
+        session.save()
+
+    def edit(self, product_id, name):
+        return self.client.post(reverse('edit_product', args=[product_id]), {
+            'name': name, 'price': '75', 'description': 'Edited',
+        })
+
+    def entries(self):
+        udata = load_catalog()["user_data"][OWNER]
+        entries = {p["id"]: p for subs in udata["subcategories"].values() for p in subs}
+        entries.update((p["id"], p) for p in udata["products"])
+        return {pid: (p["name"], p["price"]) for pid, p in entries.items()}
+
+    def test_product_listed_only_under_its_category_can_be_edited(self):
+        self.assertEqual(self.client.get(reverse('edit_product', args=[2])).status_code, 200)
+        self.edit(2, "Silk Tie")
+        self.assertEqual(self.entries()[2], ("Silk Tie", 75.0))
+        self.assertEqual(Product.objects.get(pk=2).name, "Silk Tie")
+
+    def test_rename_only_touches_the_product_and_its_copy(self):
+        self.edit(3, "Blouse")
+        self.assertEqual(self.entries(), {
+            1: ("Shirt", 100.0), 2: ("Tie", 100.0), 3: ("Blouse", 75.0), 4: ("Blouse", 75.0),
+        })
+
+
+class DeleteProductTests(CatalogFileTestCase):
+    def test_delete_removes_every_copy_from_the_storefront(self):
+        data = owner_data(product_entry("Oxford", 1), product_entry("Tie", 2))
+        data["products"] = [{"id": 3, "name": "Oxford", "subcategory": "shirts", "price": 100.0,
+                             "image_path": "/media/products/default.png"}]
+        self.write_catalog({OWNER: data})
+        session = self.client.session
+        session['email'] = OWNER
+        session.save()
+
+        self.client.get(reverse('delete_product', args=[3]))
+
+        self.assertEqual([p["name"] for p in get_catalog().products], ["Tie"])
+        self.assertEqual(list(Product.objects.values_list('id', flat=True)), [2])
+        response = self.client.get(reverse('customer_home'))
+        self.assertContains(response, "Tie")
+        self.assertNotContains(response, "Oxford")
+
+
+class SaveCatalogTests(CatalogFileTestCase):
+    def test_concurrent_writers_to_different_owners_both_survive(self):
+        other = 'other@example.com'
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1)), other: owner_data(product_entry("Tie", 2))})
+
+        first = load_catalog(copy_data=True)
+        second = load_catalog(copy_data=True)
+        first["user_data"][OWNER]["subcategories"]["mens"][0]["price"] = 150.0
+        second["user_data"][other]["subcategories"]["mens"].append(product_entry("Belt"))
+        save_catalog(first)
+        save_catalog(second)
+
+        user_data = self.read_file()["user_data"]
+        self.assertEqual(user_data[OWNER]["subcategories"]["mens"][0]["price"], 150.0)
+        self.assertEqual([p["name"] for p in user_data[other]["subcategories"]["mens"]], ["Tie", "Belt"])
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_ids_of_deleted_products_are_not_reused(self):
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1), product_entry("Tie", 2))})
+        catalog.record_changes(OWNER, [{"op": "delete", "section": "subcategories", "category": "mens", "id": 2}])
+
+        data = load_catalog(copy_data=True)
+        data["user_data"][OWNER]["subcategories"]["mens"].append(product_entry("Belt"))
+        save_catalog(data)
+        # A whole document saved without the counter keeps it too
+        self.write_catalog({OWNER: self.read_file()["user_data"][OWNER]})
+        catalog.merge_entries(OWNER, [{"category": "mens", "name": "Hat", "fields": {"price": 10.0}}])
+
+        ids = {p["name"]: p["id"] for p in self.read_file()["user_data"][OWNER]["subcategories"]["mens"]}
+        self.assertEqual(ids, {"Shirt": 1, "Belt": 3, "Hat": 4})
+
+    @unittest.skipUnless(catalog.fcntl, "flock is POSIX only")
+    def test_lock_waits_for_another_process(self):
+        holder = subprocess.Popen(
+            [sys.executable, '-c',
+             'import fcntl, sys, time\n'
+             'f = open(sys.argv[1], "a+b")\n'
+             'fcntl.flock(f.fileno(), fcntl.LOCK_EX)\n'
+             'print("locked", flush=True)\n'
+             'time.sleep(0.5)\n',
+             str(catalog.LOCK_FILE)],
+            stdout=subprocess.PIPE,
+        )
+        self.addCleanup(holder.wait)
+        self.assertEqual(holder.stdout.readline().strip(), b"locked")
+        holder.stdout.close()
+
+        start = time.monotonic()
+        with catalog_lock():
+            waited = time.monotonic() - start
+        self.assertGreater(waited, 0.2)
+
+    def test_cache_is_revalidated_against_the_file(self):
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1))})
+        cached = load_catalog()
+        self.assertIs(load_catalog(), cached)
+
+        # Another process replaces data.json
+        data = self.read_file()
+        data["user_data"][OWNER]["subcategories"]["mens"].append(product_entry("Hat", 2))
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+        reloaded = load_catalog()
+        self.assertIsNot(reloaded, cached)
+        self.assertEqual(len(reloaded["user_data"][OWNER]["subcategories"]["mens"]), 2)
+
+
+class LegacyProductRowTests(CatalogFileTestCase):
+    """Rows made before the catalog tables have no owner and their own auto-increment ids."""
+
+    def legacy(self, pk, name):
+        return Product.objects.create(id=pk, name=name, price=5)
+
+    def test_sync_moves_an_unrelated_row_instead_of_deleting_it(self):
+        self.legacy(1, "Lamp")
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1))})
+
+        self.assertEqual(Product.objects.get(pk=1).name, "Shirt")
+        lamp = Product.objects.get(name="Lamp")
+        self.assertGreater(lamp.pk, 1)
+        self.assertIsNone(lamp.owner_id)
+
+    def test_migration_rekeys_rows_to_their_catalog_ids(self):
+        rekey = import_module('owner.migrations.0013_rekey_legacy_products').rekey_legacy_products
+        with mock.patch('owner.catalog._sync_tables'):
+            self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1), product_entry("Tie", 2))})
+        self.legacy(1, "Tie")
+        self.legacy(2, "Lamp")
+
+        rekey(django_apps, SimpleNamespace(connection=connection))
+
+        self.assertEqual(Product.objects.get(name="Tie").pk, 2)
+        self.assertGreater(Product.objects.get(name="Lamp").pk, 2)
+        # The next sync adopts the re-keyed row instead of making another
+        self.write_catalog({OWNER: self.read_file()["user_data"][OWNER]})
+        self.assertEqual(Product.objects.filter(name="Tie").count(), 1)
+        self.assertEqual(Product.objects.get(pk=2).owner.email, OWNER)
+        self.assertEqual(Product.objects.count(), 3)
+
+
+class JournalTests(CatalogFileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1), product_entry("Tie", 2))})
+
+    def rate(self, name, rating):
+        return catalog.record_changes(OWNER, [{
+            "op": "update", "section": "subcategories", "category": "mens", "name": name,
+            "fields": {"rating": rating},
+        }])
+
+    def ratings(self):
+        return {p["name"]: p["rating"] for p in load_catalog()["user_data"][OWNER]["subcategories"]["mens"]}
+
+    def queries_for_one_edit(self, rating):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.rate("Shirt", rating))
+        return len(queries)
+
+    def test_edit_cost_does_not_grow_with_the_catalog(self):
+        few = self.queries_for_one_edit(5)
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1), product_entry("Tie", 2),
+                                              *[product_entry(f"Sock {i}", 10 + i) for i in range(200)])})
+        many = self.queries_for_one_edit(5)
+        self.assertEqual(few, many)
+
+        # Only the edited row is read and written, and ids are not reassigned
+        with mock.patch.object(Product, 'from_db', side_effect=Product.from_db) as loaded, \
+                mock.patch('owner.catalog._assign_ids') as assign_ids:
+            self.rate("Shirt", 3)
+        self.assertEqual(loaded.call_count, 1)
+        assign_ids.assert_not_called()
+        self.assertEqual(Product.objects.get(pk=1).rating, 3)
+
+    def test_changes_are_replayed_on_load(self):
+        self.assertTrue(self.rate("Shirt", 5))
+        self.assertTrue(self.rate("Tie", 3))
+
+        # data.json itself is untouched; a fresh process replays the journal
+        self.assertEqual(self.read_file()["user_data"][OWNER]["subcategories"]["mens"][0]["rating"], 0)
+        invalidate_catalog()
+        self.assertEqual(self.ratings(), {"Shirt": 5, "Tie": 3})
+        self.assertEqual(Product.objects.get(pk=1).rating, 5)
+
+    def test_journal_is_compacted_into_data_json(self):
+        self.rate("Shirt", 5)
+        with mock.patch('owner.catalog.JOURNAL_COMPACT_BYTES', 0):
+            self.rate("Tie", 3)
+
+        data = self.read_file()
+        self.assertEqual(data["journal_seq"], 2)
+        self.assertEqual({p["name"]: p["rating"] for p in data["user_data"][OWNER]["subcategories"]["mens"]},
+                         {"Shirt": 5, "Tie": 3})
+        self.assertEqual(catalog.JOURNAL_FILE.stat().st_size, 0)
+        invalidate_catalog()
+        self.assertEqual(self.ratings(), {"Shirt": 5, "Tie": 3})
+
+    def test_truncated_last_line_is_ignored(self):
+        self.rate("Shirt", 5)
+        # A writer crashed half way through its entry
+        with open(catalog.JOURNAL_FILE, 'ab') as f:
+            f.write(b'{"seq": 2, "owner": "owner@exa')
+
+        invalidate_catalog()
+        self.assertEqual(self.ratings(), {"Shirt": 5, "Tie": 0})
+
+        # Later entries still apply, in this process and after a restart
+        self.assertTrue(self.rate("Tie", 4))
+        self.assertEqual(self.ratings(), {"Shirt": 5, "Tie": 4})
+        invalidate_catalog()
+        self.assertEqual(self.ratings(), {"Shirt": 5, "Tie": 4})
+
+
+class CursorPaginatorCountTests(TestCase):
+    def test_exact_count_is_not_marked_as_estimate(self):
+        Product.objects.create(name="Shirt", price=10)
+        paginator = CursorPaginator(Product.objects.all(), 10, 'id')
+        self.assertEqual(paginator.count, 1)
+        self.assertFalse(paginator.count_is_estimate)
+
+
+class TypeaheadTests(TestCase):
+    def product(self, pid, name, category='mens', subcategory='shirts'):
+        return {"id": pid, "name": name, "category": category, "subcategory": subcategory,
+                "price": 100.0, "image_path": "/media/products/default.png"}
+
+    def test_big_category_does_not_hide_name_matches(self):
+        # Every product of the category shares the key "shirts", which sorts before "shirtsleeve"
+        products = [self.product(pid, f"Item {pid}") for pid in range(1, TypeaheadIndex.MAX_SCAN + 2)]
+        products.append(self.product(9999, "Shirtsleeve Blouse", category='womens', subcategory='tops'))
+        index = TypeaheadIndex(products)
+
+        results = index.complete("shirts", limit=3)
+        self.assertEqual([r["id"] for r in results], [9999, 1, 10])
+
+    def test_category_matches_fill_remaining_slots_in_name_order(self):
+        index = TypeaheadIndex([
+            self.product(1, "Zebra Print", subcategory='tees'),
+            self.product(2, "Apple Print", subcategory='tees'),
+            self.product(3, "Tee Classic", subcategory='basics'),
+        ])
+        self.assertEqual([r["id"] for r in index.complete("tee")], [3, 2, 1])
+        self.assertEqual([r["id"] for r in index.complete("tees")], [2, 1])
+
+
+class SubcategoryImportTests(CatalogFileTestCase):
+    CSV = [
+        "Category,Subcategory,Product Name,Price,Description,Image Path\n",
+        "mens,shirts,Shirt,150,Imported,\n",
+        "mens,hats,Hat,80,New,\n",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1), product_entry("Tie", 2))})
+
+    def test_edits_made_during_the_import_are_kept(self):
+        def edit_meanwhile(processed, result, force=False):
+            if processed != 1:
+                return
+            catalog.record_changes(OWNER, [{
+                "op": "update", "section": "subcategories", "category": "mens", "id": 1,
+                "fields": {"name": "Blue Shirt"},
+            }, {
+                "op": "update", "section": "subcategories", "category": "mens", "id": 2,
+                "fields": {"rating": 5},
+            }])
+
+        result = import_subcategories_csv(self.CSV, OWNER, progress=edit_meanwhile)
+
+        self.assertEqual(result.success_count, 2)
+        entries = {p["id"]: p for p in self.read_file()["user_data"][OWNER]["subcategories"]["mens"]}
+        self.assertEqual(sorted(entries), [1, 2, 3])
+        self.assertEqual((entries[1]["name"], entries[1]["price"]), ("Blue Shirt", 150.0))
+        self.assertEqual(entries[2]["rating"], 5)
+        self.assertEqual((entries[3]["name"], entries[3]["subcategory"]), ("Hat", "hats"))
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_rows_with_an_invalid_price_are_not_imported(self):
+        result = import_subcategories_csv([
+            "Category,Subcategory,Product Name,Price,Description,Image Path\n",
+            "mens,hats,Hat,cheap,New,\n",
+            "mens,hats,Cap,nan,New,\n",
+            "mens,shirts,Shirt,150,Imported,\n",
+        ], OWNER)
+
+        self.assertEqual((result.success_count, result.error_count), (1, 2))
+        names = [p["name"] for p in self.read_file()["user_data"][OWNER]["subcategories"]["mens"]]
+        self.assertEqual(names, ["Shirt", "Tie"])
+        self.assertFalse(Product.objects.filter(name__in=["Hat", "Cap"]).exists())
+
+    def test_stale_running_job_is_requeued(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory, True)
+        upload = directory / 'upload.csv'
+        upload.write_text(''.join(self.CSV), encoding='utf-8')
+        stale = ImportJob.objects.create(owner_email=OWNER, upload_path=str(upload), status=ImportJob.RUNNING,
+                                         started_at=timezone.now() - timedelta(days=1))
+        running = ImportJob.objects.create(owner_email=OWNER, upload_path=str(upload), status=ImportJob.RUNNING,
+                                           started_at=timezone.now())
+
+        self.assertEqual(run_pending_jobs(), 1)
+
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual((stale.status, stale.success_count), (ImportJob.DONE, 2))
+        self.assertEqual(running.status, ImportJob.RUNNING)
+        self.assertEqual(len(self.read_file()["user_data"][OWNER]["subcategories"]["mens"]), 3)
+
+
+class MediaFileTestCase(CatalogFileTestCase):
+    """Also points MEDIA_ROOT at a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def store(self, content, kind='products', age=3600):
+        """Store `content` by hash, dated `age` seconds ago, and return its storage name."""
+        name, _ = store_chunks([content], kind, '.png')
+        self.age(name, age)
+        return name
+
+    def age(self, name, seconds):
+        then = time.time() - seconds
+        os.utime(self.path(name), (then, then))
+
+    def add_thumbnail(self, name, width=200):
+        thumb = thumbnail_name(name, width, 'jpg')
+        os.makedirs(os.path.dirname(self.path(thumb)), exist_ok=True)
+        with open(self.path(thumb), 'wb') as f:
+            f.write(b'thumb')
+        self.age(thumb, 3600)
+        return thumb
+
+
+class ReleaseMediaTests(MediaFileTestCase):
+    def test_shared_file_is_kept_until_every_product_releases_it(self):
+        name = self.store(b'same picture')
+        thumb = self.add_thumbnail(name)
+        first = Product.objects.create(name="Shirt", price=100, image=name)
+        second = Product.objects.create(name="Tie", price=50, image=name)
+        self.assertEqual(self.store(b'same picture'), name)
+        self.age(name, 3600)
+
+        first.delete()
+        self.assertFalse(release_media(media_url(name)))
+        self.assertTrue(os.path.exists(self.path(name)))
+
+        second.delete()
+        self.assertTrue(release_media(media_url(name)))
+        self.assertFalse(os.path.exists(self.path(name)))
+        self.assertFalse(os.path.exists(self.path(thumb)))
+
+    def test_file_in_an_order_snapshot_is_kept(self):
+        name = self.store(b'ordered picture')
+        user = django_apps.get_model('auth', 'User').objects.create_user('buyer', password='x')
+        django_apps.get_model('customer', 'CustomerOrder').objects.create(
+            user=user, order_id='ORD-1', total_amount=100, grand_total=100, shipping_address={},
+            products=[{"name": "Shirt", "price": 100, "image": media_url(name)}],
+        )
+        self.assertFalse(release_media(media_url(name)))
+        self.assertTrue(os.path.exists(self.path(name)))
+
+    def test_file_in_the_catalog_document_is_kept(self):
+        name = self.store(b'catalog picture')
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1, image=media_url(name)))})
+        self.assertFalse(release_media(media_url(name)))
+        self.assertTrue(os.path.exists(self.path(name)))
+
+    def test_recently_stored_file_is_not_released(self):
+        name = self.store(b'fresh upload', age=0)
+        self.assertFalse(release_media(media_url(name)))
+        self.assertTrue(os.path.exists(self.path(name)))
+
+
+class GcMediaTests(MediaFileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.in_catalog = self.store(b'catalog picture')
+        self.in_table = self.store(b'table picture', kind='category_images')
+        self.orphan = self.store(b'orphan picture')
+        self.write_catalog({OWNER: owner_data(product_entry("Shirt", 1, image=media_url(self.in_catalog)))})
+        Category.objects.create(name="bags", image=self.in_table)
+        self.thumbs = [self.add_thumbnail(name) for name in (self.in_catalog, self.in_table, self.orphan)]
+
+    def gc_media(self, *args):
+        out = StringIO()
+        call_command('gc_media', *args, min_age=0, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.gc_media('--delete', '--dry-run')
+
+        self.assertIn("2 orphaned files", output)
+        for name in [self.in_catalog, self.in_table, self.orphan] + self.thumbs:
+            self.assertTrue(os.path.exists(self.path(name)), name)
+
+    def test_referenced_files_and_their_thumbnails_are_kept(self):
+        self.gc_media('--delete')
+
+        for name in (self.in_catalog, self.in_table, self.thumbs[0], self.thumbs[1]):
+            self.assertTrue(os.path.exists(self.path(name)), name)
+        self.assertFalse(os.path.exists(self.path(self.orphan)))
+        self.assertFalse(os.path.exists(self.path(self.thumbs[2])))
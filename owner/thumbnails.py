@@ -0,0 +1,97 @@
+# owner/thumbnails.py
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.utils._os import safe_join
+from PIL import Image, ImageOps
+
+from .media import media_name, media_url
+
+logger = logging.getLogger(__name__)
+
+# Widths derivatives are made at; product cards show images at about 200 CSS px
+THUMBNAIL_WIDTHS = (200, 400, 800)
+DEFAULT_WIDTH = 400
+
+# WebP for browsers that take it, JPEG for the rest
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+QUALITY = 80
+
+THUMBNAIL_DIR = 'thumbs'
+
+
+def thumbnail_name(name, width, fmt):
+    """Storage name of a derivative: thumbs/<width>/<original name>.<fmt>."""
+    return f"{THUMBNAIL_DIR}/{width}/{name}.{fmt}"
+
+
+def thumbnail_url(url, width=DEFAULT_WIDTH, fmt='jpg'):
+    """URL of a derivative of a /media/ image; other URLs (static defaults) are returned as is."""
+    name = media_name(url)
+    if not name or name.startswith(THUMBNAIL_DIR + '/'):
+        return url
+    return media_url(thumbnail_name(name, width, fmt))
+
+
+def srcset(url, fmt='jpg'):
+    """`srcset` value listing every width of an image, or '' when there are no derivatives."""
+    if not media_name(url):
+        return ''
+    return ', '.join(f"{thumbnail_url(url, width, fmt)} {width}w" for width in THUMBNAIL_WIDTHS)
+
+
+def parse_thumbnail_path(path):
+    """(original name, width, fmt) for a path below thumbs/, or None if it isn't a valid derivative."""
+    parts = path.split('/', 1)
+    if len(parts) != 2 or not parts[0].isdigit() or int(parts[0]) not in THUMBNAIL_WIDTHS:
+        return None
+    name, _, fmt = parts[1].rpartition('.')
+    if fmt not in FORMATS or not name or name.startswith(THUMBNAIL_DIR + '/'):
+        return None
+    return name, int(parts[0]), fmt
+
+
+def generate_thumbnail(name, width, fmt):
+    """
+    Make (once) the derivative of a stored image and return its path. Images
+    are shrunk to `width` (never enlarged), EXIF-rotated and re-encoded.
+    Raises FileNotFoundError if the original is missing.
+    """
+    source = safe_join(settings.MEDIA_ROOT, name)
+    target = safe_join(settings.MEDIA_ROOT, thumbnail_name(name, width, fmt))
+    # Stored names never get new content, so an existing derivative is current
+    if os.path.exists(target):
+        return target
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if FORMATS[fmt] == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        image.thumbnail((width, width * 4), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.thumb-', dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                image.save(out, FORMATS[fmt], quality=QUALITY, optimize=True)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    logger.debug(f"Generated {width}px {fmt} thumbnail for {name}")
+    return target
+
+
+def delete_thumbnails(name):
+    """Remove every derivative of a stored image."""
+    for width in THUMBNAIL_WIDTHS:
+        for fmt in FORMATS:
+            try:
+                os.remove(safe_join(settings.MEDIA_ROOT, thumbnail_name(name, width, fmt)))
+            except OSError:
+                pass
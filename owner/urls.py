@@ -24,8 +24,8 @@ urlpatterns = [
 
     # -------------------- Product Management --------------------
     path("manage_products/", views.manage_products, name="manage_products"),
-    path("edit_product/<str:old_name>/", views.edit_product, name="edit_product"),
-    path("delete_product/<str:product_name>/", views.delete_product, name="delete_product"),
+    path("edit_product/<int:product_id>/", views.edit_product, name="edit_product"),
+    path("delete_product/<int:product_id>/", views.delete_product, name="delete_product"),
 
     # -------------------- Search --------------------
     path("search/", views.search_products, name="search_products"),
@@ -40,6 +40,7 @@ urlpatterns = [
     path('import-categories/', views.import_categories, name='import_categories'),
     path('export-subcategories/', views.export_subcategories, name='export_subcategories'),
     path('import-subcategories/', views.import_subcategories, name='import_subcategories'),
+    path('import-jobs/<int:job_id>/', views.import_job_status, name='import_job_status'),
     path('update-subcategory-image/', views.update_subcategory_image, name='update_subcategory_image'),
 
     # -------------------- Profile --------------------
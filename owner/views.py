@@ -1,41 +1,51 @@
 # views.py
 import json
 import os
-import uuid
 from pathlib import Path
 from django.conf import settings
 from django.shortcuts import render, redirect
 from django.core.paginator import Paginator
-from django.core.exceptions import ValidationError
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError, SuspiciousFileOperation
+from django.http import JsonResponse, FileResponse, Http404
 from django.views.decorators.http import require_GET
 import logging
 from django.db.models import Q
 from django.urls import reverse
 
 # Models and Forms
-from .models import Category, SubCategory, Product
+from .models import Category, SubCategory, Product, ImportJob
 from .forms import CategoryForm, SubCategoryForm
 
+from .pagination import paginate
+from .search import get_search_index, get_typeahead_index
+from .imports import import_categories_csv
+from .jobs import enqueue_subcategory_import, job_status
+from .media import store_upload, release_media
+from .thumbnails import generate_thumbnail, parse_thumbnail_path
+from .export import CATEGORY_HEADER, SUBCATEGORY_HEADER, category_rows, subcategory_rows, csv_response
+from .catalog import DATA_FILE, CatalogDocument, load_catalog, save_catalog, record_changes, image_url
+
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # -------------------- Data persistence --------------------
-DATA_FILE = Path(__file__).parent / 'data.json'
-
-def load_data():
+def load_data(for_update=False):
+    """
+    The catalog document. It is the cached copy shared by the whole process
+    and must not be modified, unless `for_update` is set: views that edit it
+    before save_data() get a private copy.
+    """
     if DATA_FILE.exists():
         try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logger.debug(f"Loaded data: {data}")
-                return data
+            return load_catalog(copy_data=for_update)
         except Exception as e:
+            # Don't overwrite the catalog on disk just because it could not be read
             logger.error(f"Error loading data.json: {str(e)}")
             logger.warning("Returning default data due to error")
-            default_data = {"users": {}, "user_data": {}}
-            save_data(default_data)
+            # Saving this document only merges the entries a view adds to it
+            default_data = CatalogDocument(users={}, user_data={})
+            default_data.base = {"users": {}, "user_data": {}}
             return default_data
     logger.warning("data.json does not exist, creating default")
     default_data = {"users": {}, "user_data": {}}
@@ -44,13 +54,39 @@ def load_data():
 
 def save_data(data):
     try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False)
+        # Locked read-modify-write with an atomic replace, see owner.catalog
+        save_catalog(data)
         logger.debug("Successfully saved data.json")
     except Exception as e:
         logger.error(f"Error saving data.json: {str(e)}")
 
 
+def get_owner_products(email, queryset=None):
+    """An owner's products from the catalog tables, shaped like data.json entries."""
+    if queryset is None:
+        queryset = Product.objects.all()
+    rows = (
+        queryset.filter(owner__email=email)
+        .order_by('id')
+        .values_list('id', 'name', 'category__name', 'subcategory__name', 'price',
+                     'image', 'description', 'rating', 'quantity')
+    )
+    return [
+        {
+            "id": pk,
+            "name": name,
+            "category": category or "",
+            "subcategory": subcategory or "",
+            "price": float(price),
+            "image": image_url(image),
+            "description": description,
+            "rating": rating or 0,
+            "quantity": quantity,
+        }
+        for pk, name, category, subcategory, price, image, description, rating, quantity in rows
+    ]
+
+
 # -------------------- Image Validation --------------------
 def validate_image(image):
     valid_extensions = ['.jpg', '.jpeg', '.png']
@@ -62,7 +98,7 @@ def validate_image(image):
 
 # -------------------- Authentication --------------------
 def login_view(request):
-    data = load_data()
+    data = load_data(for_update=request.method == "POST")
     users = data['users']
     user_data = data['user_data']
     
@@ -89,7 +125,7 @@ def login_view(request):
     return render(request, "login.html", {"msg": ""})
 
 def register_view(request):
-    data = load_data()
+    data = load_data(for_update=request.method == "POST")
     users = data['users']
     user_data = data['user_data']
     
@@ -109,17 +145,7 @@ def register_view(request):
         if profile_picture:
             try:
                 validate_image(profile_picture)
-                profile_dir = os.path.join(settings.MEDIA_ROOT, "profiles")
-                os.makedirs(profile_dir, exist_ok=True)
-                ext = os.path.splitext(profile_picture.name)[1]
-                unique_filename = f"{uuid.uuid4().hex}{ext}"
-                profile_path = os.path.join(profile_dir, unique_filename)
-                
-                with open(profile_path, "wb+") as dest:
-                    for chunk in profile_picture.chunks():
-                        dest.write(chunk)
-                
-                profile_pic_path = f"/media/profiles/{unique_filename}"
+                profile_pic_path = store_upload(profile_picture, "profiles")
             except ValidationError as e:
                 return render(request, "register.html", {"msg": str(e)})
         
@@ -174,7 +200,7 @@ def update_profile(request):
     
     if request.method == "POST":
         try:
-            data = load_data()
+            data = load_data(for_update=True)
             users = data['users']
             
             if email not in users:
@@ -193,31 +219,17 @@ def update_profile(request):
                 try:
                     validate_image(profile_picture)
                     
-                    # Delete old profile picture if it's not the default
+                    # Stored by content; the old picture is released once saved
                     old_picture = users[email].get("profile_picture", "")
-                    if old_picture and "/default.png" not in old_picture:
-                        full_path = os.path.join(settings.MEDIA_ROOT, old_picture.replace("/media/", ""))
-                        if os.path.exists(full_path):
-                            os.remove(full_path)
-                    
-                    # Save new profile picture
-                    profile_dir = os.path.join(settings.MEDIA_ROOT, "profiles")
-                    os.makedirs(profile_dir, exist_ok=True)
-                    ext = os.path.splitext(profile_picture.name)[1]
-                    unique_filename = f"{uuid.uuid4().hex}{ext}"
-                    profile_path = os.path.join(profile_dir, unique_filename)
-                    
-                    with open(profile_path, "wb+") as dest:
-                        for chunk in profile_picture.chunks():
-                            dest.write(chunk)
-                    
-                    users[email]["profile_picture"] = f"/media/profiles/{unique_filename}"
-                    request.session["profile_picture"] = f"/media/profiles/{unique_filename}"
+                    users[email]["profile_picture"] = store_upload(profile_picture, "profiles")
+                    request.session["profile_picture"] = users[email]["profile_picture"]
                     
                 except ValidationError as e:
                     return JsonResponse({"success": False, "error": str(e)})
             
             save_data(data)
+            if profile_picture and old_picture != users[email]["profile_picture"]:
+                release_media(old_picture)
             return JsonResponse({"success": True, "message": "Profile updated successfully"})
             
         except Exception as e:
@@ -227,7 +239,6 @@ def update_profile(request):
 
 # -------------------- Search --------------------
 def search_view(request):
-    data = load_data()
     email = request.session.get("email")
     if not email:
         return redirect("login")
@@ -236,24 +247,8 @@ def search_view(request):
     results = []
 
     if query:
-        user_data_email = data['user_data'].get(email, {})
-        products = user_data_email.get("products", [])
-        categories = user_data_email.get("categories", [])
-        subcategories = user_data_email.get("subcategories", {})
-
-        for p in products:
-            product_name = p["name"].lower()
-            subcat_name = p.get("subcategory", "").lower()
-            description = p.get("description", "").lower()
-
-            if query in product_name or query in subcat_name or query in description:
-                results.append(p)
-            else:
-                for cat in categories:
-                    if query in cat.lower():
-                        if subcat_name in [s["subcategory"].lower() for s in subcategories.get(cat, [])]:
-                            results.append(p)
-                            break
+        # Name, category, subcategory and description matches, best first
+        results = get_search_index().search(query, owner=email)
 
     return render(request, "search_results.html", {"query": query, "results": results})
 
@@ -264,19 +259,8 @@ def search_products(request):
         if len(query) < 2:
             return JsonResponse({'results': []})
 
-        matched_products = Product.objects.filter(name__icontains=query)[:10]
-        results = []
-
-        for product in matched_products:
-            results.append({
-                'id': product.pk,
-                'name': product.name,
-                'category': product.subcategory.category.name if product.subcategory and product.subcategory.category else 'N/A',
-                'subcategory': product.subcategory.name if product.subcategory else 'N/A',
-                'price': str(product.price),
-                'description': product.__str__(),
-                'image_path': product.image.url if product.image else '/static/images/no-image.png'
-            })
+        # In-memory prefix index with the display fields already joined
+        results = get_typeahead_index().complete(query, limit=10)
 
         return JsonResponse({'results': results})
 
@@ -304,7 +288,7 @@ def manage_category(request):
     page_obj = paginator.get_page(page_number)
 
     form = CategoryForm()
-    data = load_data()
+    data = load_data(for_update=request.method == "POST")
     email = request.session.get("email")
     
     # Check for import status in session
@@ -339,7 +323,7 @@ def delete_category(request, cat_name):
     try:
         category = Category.objects.get(name=cat_name)
         category.delete()
-        data = load_data()
+        data = load_data(for_update=True)
         email = request.session.get("email")
         if email and email in data['user_data']:
             user_data_email = data['user_data'][email]
@@ -358,7 +342,7 @@ def edit_category(request, cat_name):
     except Category.DoesNotExist:
         return redirect("manage_category")
 
-    data = load_data()
+    data = load_data(for_update=request.method == "POST")
     email = request.session.get("email")
 
     if request.method == "POST":
@@ -421,14 +405,15 @@ def manage_subcategory(request):
 
     # Fetch categories from the Category model
     categories = [cat.name for cat in Category.objects.all()]
-    data = load_data()
-    user_data_email = data['user_data'].get(email, {})
-    subcategories = user_data_email.get("subcategories", {})
 
     error = request.GET.get('error', '')
     success = request.GET.get('success', '')
 
     if request.method == "POST":
+        data = load_data(for_update=True)
+        user_data_email = data['user_data'].get(email, {})
+        subcategories = user_data_email.get("subcategories", {})
+
         category = request.POST.get("category")
         product_name = request.POST.get("name")
         subcategory_name = request.POST.get("subcategory")
@@ -447,15 +432,7 @@ def manage_subcategory(request):
             relative_path = "/media/products/default.png"
             if image:
                 validate_image(image)
-                image_dir = os.path.join(settings.MEDIA_ROOT, "products")
-                os.makedirs(image_dir, exist_ok=True)
-                ext = os.path.splitext(image.name)[1]
-                unique_filename = f"{uuid.uuid4().hex}{ext}"
-                image_path = os.path.join(image_dir, unique_filename)
-                with open(image_path, "wb+") as dest:
-                    for chunk in image.chunks():
-                        dest.write(chunk)
-                relative_path = f"/media/products/{unique_filename}"
+                relative_path = store_upload(image)
 
             if category not in subcategories:
                 subcategories[category] = []
@@ -479,11 +456,7 @@ def manage_subcategory(request):
             return redirect(reverse('manage_subcategory') + '?error=' + str(e))
 
     # Collect all subcategories for display
-    all_subs = []
-    for cat, subs in subcategories.items():
-        for sc in subs:
-            sc["category"] = cat
-            all_subs.append(sc)
+    all_subs = get_owner_products(email, Product.objects.filter(category__isnull=False))
 
     # Apply filtering if requested
     category_filter = request.GET.get('category', '')
@@ -538,15 +511,18 @@ def manage_subcategory(request):
     })
 
 def delete_subcategory(request, category, name):
-    data = load_data()
+    data = load_data(for_update=True)
     email = request.session.get("email")
     if not email or email not in data['user_data']:
         return redirect("login")
 
     subcategories = data['user_data'][email].get("subcategories", {})
     if category in subcategories:
+        removed = [sc.get("image") for sc in subcategories[category] if sc["name"] == name]
         subcategories[category] = [sc for sc in subcategories[category] if sc["name"] != name]
         save_data(data)
+        for image in removed:
+            release_media(image)
 
     return redirect("manage_subcategory")
 
@@ -557,7 +533,7 @@ def edit_subcategory(request, cat_name, old_subcat_name):
 
     # Fetch categories from the Category model
     categories = [cat.name for cat in Category.objects.all()]
-    data = load_data()
+    data = load_data(for_update=request.method == "POST")
     user_data_email = data['user_data'].get(email, {})
     subcategories = user_data_email.get("subcategories", {})
 
@@ -584,15 +560,7 @@ def edit_subcategory(request, cat_name, old_subcat_name):
                 # Handle image update
                 if new_image:
                     validate_image(new_image)
-                    image_dir = os.path.join(settings.MEDIA_ROOT, "products")
-                    os.makedirs(image_dir, exist_ok=True)
-                    ext = os.path.splitext(new_image.name)[1]
-                    unique_filename = f"{uuid.uuid4().hex}{ext}"
-                    image_path = os.path.join(image_dir, unique_filename)
-                    with open(image_path, "wb+") as dest:
-                        for chunk in new_image.chunks():
-                            dest.write(chunk)
-                    relative_path = f"/media/products/{unique_filename}"
+                    relative_path = store_upload(new_image)
                 else:
                     relative_path = current_subcat.get("image", "/media/products/default.png")
 
@@ -603,8 +571,10 @@ def edit_subcategory(request, cat_name, old_subcat_name):
                 if new_category not in subcategories:
                     subcategories[new_category] = []
 
-                # Add updated subcategory/product
+                # Add updated subcategory/product. Keys the form doesn't edit,
+                # above all the product "id" carts and orders refer to, are kept
                 subcategories[new_category].append({
+                    **current_subcat,
                     "name": new_name,
                     "subcategory": new_subcat_name,
                     "price": float(new_price) if new_price else current_subcat.get("price", 0),
@@ -616,6 +586,8 @@ def edit_subcategory(request, cat_name, old_subcat_name):
                 })
 
                 save_data(data)
+                if new_image and current_subcat.get("image") != relative_path:
+                    release_media(current_subcat.get("image"))
             except ValidationError as e:
                 return render(request, "subcategory.html", {
                     "categories": categories,
@@ -628,19 +600,16 @@ def edit_subcategory(request, cat_name, old_subcat_name):
     return redirect("manage_subcategory")
 
 def search_subcategories(request):
-    data = load_data()
     email = request.session.get("email")
-    if not email or email not in data['user_data']:
+    if not email:
         return JsonResponse({"results": []})
 
     q = request.GET.get("q", "").lower()
-    subcategories = data['user_data'][email].get("subcategories", {})
-
-    all_subs = []
-    for cat, subs in subcategories.items():
-        for sc in subs:
-            sc["category"] = cat
-            all_subs.append(sc)
+    products = Product.objects.filter(category__isnull=False)
+    if q:
+        products = products.filter(
+            Q(name__icontains=q) | Q(subcategory__name__icontains=q) | Q(category__name__icontains=q)
+        )
 
     results = [
         {
@@ -648,43 +617,38 @@ def search_subcategories(request):
             "subcategory": sc["subcategory"],
             "category": sc["category"],
             "price": sc["price"],
-            "description": sc.get("description", ""),
-            "image": sc.get("image", "/media/products/default.png"),
-            "rating": sc.get("rating", 0)
+            "description": sc["description"],
+            "image": sc["image"],
+            "rating": sc["rating"]
         }
-        for sc in all_subs
-        if q in sc["name"].lower() or q in sc["subcategory"].lower() or q in sc["category"].lower()
+        for sc in get_owner_products(email, products)
     ]
 
     return JsonResponse({"results": results})
 
 def get_subcategory_count(request):
-    data = load_data()
     email = request.session.get("email")
-    if not email or email not in data['user_data']:
+    if not email:
         return JsonResponse({"count": 0})
 
-    subcategories = data['user_data'][email].get("subcategories", {})
-    count = sum(len(subs) for subs in subcategories.values())
+    count = Product.objects.filter(owner__email=email, category__isnull=False).count()
     return JsonResponse({"count": count})
 
 def update_subcategory_rating(request):
-    data = load_data()
     email = request.session.get("email")
-    if not email or email not in data['user_data']:
+    if not email:
         return JsonResponse({"success": False})
 
     category = request.POST.get("category")
     name = request.POST.get("name")
     rating = int(request.POST.get("rating", 0))
 
-    subcategories = data['user_data'][email].get("subcategories", {})
-    if category in subcategories:
-        for sc in subcategories[category]:
-            if sc["name"] == name:
-                sc["rating"] = rating
-                save_data(data)
-                return JsonResponse({"success": True, "rating": rating})
+    # Appended to the catalog journal instead of rewriting data.json
+    if record_changes(email, [{
+        "op": "update", "section": "subcategories", "category": category, "name": name,
+        "fields": {"rating": rating},
+    }]):
+        return JsonResponse({"success": True, "rating": rating})
 
     return JsonResponse({"success": False})
 
@@ -696,7 +660,7 @@ def add_subcategory(request):
 
     # Fetch categories from the Category model
     categories = [cat.name for cat in Category.objects.all()]
-    data = load_data()
+    data = load_data(for_update=request.method == "POST")
     user_data_email = data['user_data'].get(email, {})
     subcategories = user_data_email.get("subcategories", {})
 
@@ -719,15 +683,7 @@ def add_subcategory(request):
             relative_path = "/media/products/default.png"
             if image:
                 validate_image(image)
-                image_dir = os.path.join(settings.MEDIA_ROOT, "products")
-                os.makedirs(image_dir, exist_ok=True)
-                ext = os.path.splitext(image.name)[1]
-                unique_filename = f"{uuid.uuid4().hex}{ext}"
-                image_path = os.path.join(image_dir, unique_filename)
-                with open(image_path, "wb+") as dest:
-                    for chunk in image.chunks():
-                        dest.write(chunk)
-                relative_path = f"/media/products/{unique_filename}"
+                relative_path = store_upload(image)
 
             # Add to subcategories in JSON data
             if category not in subcategories:
@@ -756,13 +712,13 @@ def add_subcategory(request):
                         product_name=product_name,
                         is_active=True
                     )
-                    print(f"Notification created for product: {product_name}")
+                    logger.info(f"Notification created for product: {product_name}")
                 else:
-                    print(f"Notification already exists for product: {product_name}")
+                    logger.debug(f"Notification already exists for product: {product_name}")
             except ImportError:
-                print("Customer app not available for notifications")
-            except Exception as e:
-                print(f"Error creating notification: {str(e)}")
+                logger.warning("Customer app not available for notifications")
+            except Exception:
+                logger.exception("Error creating notification")
             
             # Redirect back to manage_subcategory with success message
             return redirect(reverse('manage_subcategory') + '?success=Product added successfully')
@@ -773,39 +729,22 @@ def add_subcategory(request):
     return redirect("manage_subcategory")
 # -------------------- Products --------------------
 def manage_products(request):
-    data = load_data()
     email = request.session.get("email")
     if not email:
         return redirect("login")
 
-    user_data_email = data['user_data'][email]
-    subcategories = user_data_email.get("subcategories", {})
-    products = user_data_email.get("products", [])
-
     enriched_products = []
 
-    # Collect products from subcategories
-    for cat, subs in subcategories.items():
-        for sc in subs:
-            enriched_products.append({
-                "name": sc.get("name", ""),
-                "price": sc.get("price", 0),
-                "image_path": sc.get("image", "/media/products/default.png"),
-                "quantity": sc.get("quantity", 1), 
-                "category": cat,
-                "subcategory": sc.get("subcategory", "No Subcategory"),
-                "description": sc.get("description", "")
-            })
-
-    # Collect products from products[]
-    for p in products:
+    for p in get_owner_products(email):
         enriched_products.append({
-            "name": p.get("name", ""),
-            "price": p.get("price", 0),
-            "image_path": p.get("image_path", "/media/products/default.png"),
-            "category": p.get("category", "No Category"),
-            "subcategory": p.get("subcategory", "No Subcategory"),
-            "description": p.get("description", "")
+            "id": p["id"],
+            "name": p["name"],
+            "price": p["price"],
+            "image_path": p["image"],
+            "quantity": p["quantity"],
+            "category": p["category"] or "No Category",
+            "subcategory": p["subcategory"] or "No Subcategory",
+            "description": p["description"]
         })
 
     # ✅ No pagination — show all products
@@ -813,39 +752,72 @@ def manage_products(request):
         "products": enriched_products
     })
 
+def _product_entries(user_data_email, product_id):
+    """
+    (section, category, entry) for the catalog entry with `product_id`, then
+    for its copies: a product can be listed both in products[] and under its
+    category in subcategories, with the same name but an id of its own.
+    Returns [] when no entry has that id.
+    """
+    products = user_data_email.get("products", [])
+    subcategories = user_data_email.get("subcategories", {})
+    found = next((("products", p.get("category"), p) for p in products if p.get("id") == product_id), None)
+    if found is None:
+        found = next(
+            (("subcategories", cat, sc) for cat, subs in subcategories.items() for sc in subs if sc.get("id") == product_id),
+            None,
+        )
+    if found is None:
+        return []
+
+    section, category, entry = found
+    name = entry["name"]
+    entries = [found]
+    if section != "products":
+        copy = next((p for p in products if p["name"] == name), None)
+        if copy is not None:
+            entries.append(("products", category, copy))
+    for cat, subs in subcategories.items():
+        # products[] entries may not record their category; then any category matches
+        if (section == "subcategories" and cat == category) or (category and cat != category):
+            continue
+        copy = next((sc for sc in subs if sc["name"] == name), None)
+        if copy is not None:
+            entries.append(("subcategories", cat, copy))
+    return entries
+
+
+def _entry_change(section, category, entry, change):
+    """A record_changes() change addressing one entry, by its id when it has one."""
+    change = dict(change, section=section)
+    if "id" in entry:
+        change["id"] = entry["id"]
+    else:
+        change["name"] = entry["name"]
+    if section == "subcategories":
+        change["category"] = category
+    return change
+
+
 # owner/views.py
-def delete_product(request, product_name):
-    data = load_data()
+def delete_product(request, product_id):
+    data = load_catalog()
     email = request.session.get("email")
     if not email:
         return redirect("login")
 
-    user_data_email = data['user_data'][email]
-    products = user_data_email["products"]
-    subcategories = user_data_email["subcategories"]
-
-    # Delete from products array
-    for i, p in enumerate(products):
-        if p["name"] == product_name:
-            if p.get("image_path") and "/default.png" not in p["image_path"]:
-                full_path = os.path.join(settings.MEDIA_ROOT, p["image_path"].replace("/media/", ""))
-                if os.path.exists(full_path):
-                    os.remove(full_path)
-            del products[i]
-            break
-    
-    # Delete from subcategories
-    for cat, subs in subcategories.items():
-        for i, sc in enumerate(subs):
-            if sc["name"] == product_name:
-                if sc.get("image") and "/default.png" not in sc["image"]:
-                    full_path = os.path.join(settings.MEDIA_ROOT, sc["image"].replace("/media/", ""))
-                    if os.path.exists(full_path):
-                        os.remove(full_path)
-                del subs[i]
-                break
+    changes = []
+    images = []
+    # The entry and its same-named copies, so no copy stays on the storefront
+    for section, category, entry in _product_entries(data['user_data'][email], product_id):
+        images.append(entry.get("image_path" if section == "products" else "image"))
+        changes.append(_entry_change(section, category, entry, {"op": "delete"}))
 
-    save_data(data)
+    record_changes(email, changes)
+
+    # Images are shared by content; only unreferenced ones are deleted
+    for image in images:
+        release_media(image)
     
     # Clear cache if you're using any
     from django.core.cache import cache
@@ -853,18 +825,20 @@ def delete_product(request, product_name):
     
     return redirect("manage_products")
 
-def edit_product(request, old_name):
-    data = load_data()
+def edit_product(request, product_id):
+    data = load_catalog()
     email = request.session.get("email")
     if not email:
         return redirect("login")
 
-    user_data_email = data['user_data'][email]
-    products = user_data_email["products"]
-    subcategories = user_data_email["subcategories"]
-    product = next((p for p in products if p["name"] == old_name), None)
-    if not product:
+    # The entry may be in products[] or only under its category; its
+    # same-named copies are kept in step with it
+    entries = _product_entries(data['user_data'][email], product_id)
+    if not entries:
         return redirect("manage_products")
+    section, category, entry = entries[0]
+    product = dict(entry)
+    product["image_path"] = entry.get("image_path" if section == "products" else "image", "/media/products/default.png")
 
     if request.method == "POST":
         new_name = request.POST.get("name")
@@ -874,37 +848,29 @@ def edit_product(request, old_name):
 
         if new_name and price:
             try:
+                new_image = None
                 if image:
                     validate_image(image)
-                    if product.get("image_path") and "/default.png" not in product["image_path"]:
-                        full_path = os.path.join(settings.MEDIA_ROOT, product["image_path"].replace("/media/", ""))
-                        if os.path.exists(full_path):
-                            os.remove(full_path)
-
-                    image_dir = os.path.join(settings.MEDIA_ROOT, 'products')
-                    os.makedirs(image_dir, exist_ok=True)
-                    ext = os.path.splitext(image.name)[1]
-                    unique_filename = f"{uuid.uuid4().hex}{ext}"
-                    image_path = os.path.join(image_dir, unique_filename)
-                    with open(image_path, 'wb+') as dest:
-                        for chunk in image.chunks():
-                            dest.write(chunk)
-                    product["image_path"] = f"/media/products/{unique_filename}"
-                product["name"] = new_name
-                product["price"] = float(price)
-                product["description"] = description or product.get("description", "")
-
-                for cat, subs in subcategories.items():
-                    for sc in subs:
-                        if sc["name"] == old_name:
-                            sc["name"] = new_name
-                            sc["subcategory"] = product.get("subcategory")
-                            sc["price"] = float(price)
-                            sc["description"] = description or sc.get("description", "")
-                            sc["image"] = product["image_path"]
-                            break
-
-                save_data(data)
+                    new_image = store_upload(image)
+
+                changes = []
+                replaced = []
+                for section, category, entry in entries:
+                    image_field = "image_path" if section == "products" else "image"
+                    fields = {
+                        "name": new_name,
+                        "price": float(price),
+                        "description": description or entry.get("description", ""),
+                    }
+                    if new_image:
+                        fields[image_field] = new_image
+                        replaced.append(entry.get(image_field))
+                    changes.append(_entry_change(section, category, entry, {"op": "update", "fields": fields}))
+
+                record_changes(email, changes)
+                for old in replaced:
+                    if old != new_image:
+                        release_media(old)
             except ValidationError as e:
                 return render(request, "edit_product.html", {"product": product, "error": str(e)})
 
@@ -942,25 +908,8 @@ from io import TextIOWrapper, StringIO
 # Add to your views.py
 
 def export_categories(request):
-    # Create a CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="categories_export.csv"'
-    
-    # Create a CSV writer
-    writer = csv.writer(response)
-    
-    # Write headers
-    writer.writerow(['Name', 'Description', 'Image Path'])
-    
-    # Get all categories
-    categories = Category.objects.all().order_by('name')
-    
-    # Write category data
-    for category in categories:
-        image_path = category.image.path if category.image else ''
-        writer.writerow([category.name, category.description or '', image_path])
-    
-    return response
+    # Stream the CSV so memory stays flat however many categories there are
+    return csv_response('categories_export.csv', CATEGORY_HEADER, category_rows())
 
 import csv
 from django.http import HttpResponse
@@ -977,85 +926,12 @@ def import_categories(request):
         
         # Process the CSV file
         try:
-            # Read the CSV file
+            # Read the CSV file in chunks and write it in bulk, in one transaction
             decoded_file = TextIOWrapper(csv_file.file, encoding='utf-8')
-            reader = csv.reader(decoded_file)
-            
-            rows = list(reader)
-            if has_headers and rows:
-                rows = rows[1:]  # Skip header row
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            # Get the maximum existing ID to continue from
-            max_id = Category.objects.all().aggregate(models.Max('id'))['id__max'] or 0
-            
-            for i, row in enumerate(rows):
-                if not row or all(cell.strip() == '' for cell in row):  # Skip empty rows
-                    continue
-                    
-                # Determine column positions
-                name = row[0].strip() if len(row) > 0 else ''
-                description = row[1].strip() if len(row) > 1 else ''
-                image_path = row[2].strip() if len(row) > 2 else None
-                
-                if not name:
-                    error_count += 1
-                    errors.append(f"Row {i+1}: Category name cannot be empty")
-                    continue
-                
-                # Check if category already exists
-                try:
-                    # Check if category with this name already exists
-                    existing_category = Category.objects.filter(name=name).first()
-                    
-                    if existing_category:
-                        # Update existing category
-                        existing_category.description = description
-                        
-                        # Handle image if provided and path exists
-                        if image_path and os.path.exists(image_path):
-                            try:
-                                with open(image_path, 'rb') as f:
-                                    existing_category.image.save(
-                                        os.path.basename(image_path), 
-                                        File(f), 
-                                        save=True
-                                    )
-                            except Exception as e:
-                                errors.append(f"Row {i+1}: Error with image file - {str(e)}")
-                        
-                        existing_category.save()
-                        success_count += 1
-                    else:
-                        # Create new category with continued ID
-                        max_id += 1
-                        category = Category(
-                            id=max_id,
-                            name=name,
-                            description=description
-                        )
-                        
-                        # Handle image if provided and path exists
-                        if image_path and os.path.exists(image_path):
-                            try:
-                                with open(image_path, 'rb') as f:
-                                    category.image.save(
-                                        os.path.basename(image_path), 
-                                        File(f), 
-                                        save=True
-                                    )
-                            except Exception as e:
-                                errors.append(f"Row {i+1}: Error with image file - {str(e)}")
-                        
-                        category.save()
-                        success_count += 1
-                    
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"Row {i+1}: Error saving category - {str(e)}")
+            result = import_categories_csv(decoded_file, has_headers=has_headers)
+            success_count = result.success_count
+            error_count = result.error_count
+            errors = result.errors
             
             # Prepare status message
             if error_count == 0:
@@ -1106,34 +982,8 @@ def export_subcategories(request):
     email = request.session.get("email")
     if not email:
         return redirect("login")
-    
-    data = load_data()
-    user_data_email = data['user_data'].get(email, {})
-    subcategories = user_data_email.get("subcategories", {})
-    
-    # Create a CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="subcategories_export.csv"'
-    
-    # Create a CSV writer
-    writer = csv.writer(response)
-    
-    # Write headers
-    writer.writerow(['Category', 'Subcategory', 'Product Name', 'Price', 'Description', 'Image Path'])
-    
-    # Write subcategory data
-    for category, subs in subcategories.items():
-        for sc in subs:
-            writer.writerow([
-                category,
-                sc.get("subcategory", ""),
-                sc.get("name", ""),
-                sc.get("price", 0),
-                sc.get("description", ""),
-                sc.get("image", "/media/products/default.png")
-            ])
-    
-    return response
+
+    return csv_response('subcategories_export.csv', SUBCATEGORY_HEADER, subcategory_rows(email))
 
 def import_subcategories(request):
     email = request.session.get("email")
@@ -1144,139 +994,61 @@ def import_subcategories(request):
         csv_file = request.FILES['csv_file']
         has_headers = request.POST.get('has_headers') == 'on'
         
-        # Process the CSV file
+        # Large files take too long for a request; a background job imports
+        # the upload and the page polls its progress
         try:
-            # Read the CSV file
-            decoded_file = TextIOWrapper(csv_file.file, encoding='utf-8')
-            reader = csv.reader(decoded_file)
-            
-            rows = list(reader)
-            if has_headers and rows:
-                rows = rows[1:]  # Skip header row
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            data = load_data()
-            user_data_email = data['user_data'].get(email, {})
-            subcategories = user_data_email.get("subcategories", {})
-            
-            for i, row in enumerate(rows):
-                if not row or all(cell.strip() == '' for cell in row):  # Skip empty rows
-                    continue
-                    
-                # Determine column positions (handle different CSV formats)
-                if len(row) >= 6:  # Full format: Category, Subcategory, Product Name, Price, Description, Image Path
-                    category = row[0].strip() if len(row) > 0 else ''
-                    subcategory_name = row[1].strip() if len(row) > 1 else ''
-                    product_name = row[2].strip() if len(row) > 2 else ''
-                    price = row[3].strip() if len(row) > 3 else '0'
-                    description = row[4].strip() if len(row) > 4 else ''
-                    image_path = row[5].strip() if len(row) > 5 else None
-                elif len(row) >= 3:  # Minimal format: Category, Product Name, Price
-                    category = row[0].strip() if len(row) > 0 else ''
-                    product_name = row[1].strip() if len(row) > 1 else ''
-                    price = row[2].strip() if len(row) > 2 else '0'
-                    subcategory_name = product_name  # Use product name as subcategory name
-                    description = ''
-                    image_path = None
-                else:
-                    error_count += 1
-                    errors.append(f"Row {i+1}: Invalid format - needs at least 3 columns")
-                    continue
-                
-                if not category or not product_name or not price:
-                    error_count += 1
-                    errors.append(f"Row {i+1}: Category, Product Name, and Price are required")
-                    continue
-                
-                try:
-                    # Check if product already exists in this category
-                    if category in subcategories and any(sc["name"] == product_name for sc in subcategories[category]):
-                        # Update existing subcategory
-                        for sc in subcategories[category]:
-                            if sc["name"] == product_name:
-                                sc["subcategory"] = subcategory_name
-                                sc["price"] = float(price)
-                                sc["description"] = description
-                                if image_path and os.path.exists(image_path):
-                                    try:
-                                        with open(image_path, 'rb') as f:
-                                            # For JSON data, we store the path, not the file
-                                            sc["image"] = f"/media/products/{os.path.basename(image_path)}"
-                                    except Exception as e:
-                                        errors.append(f"Row {i+1}: Error with image file - {str(e)}")
-                                break
-                        success_count += 1
-                    else:
-                        # Create new subcategory
-                        relative_path = "/media/products/default.png"
-                        if image_path and os.path.exists(image_path):
-                            try:
-                                # Copy image to media directory
-                                image_dir = os.path.join(settings.MEDIA_ROOT, "products")
-                                os.makedirs(image_dir, exist_ok=True)
-                                unique_filename = f"{uuid.uuid4().hex}{os.path.splitext(image_path)[1]}"
-                                destination_path = os.path.join(image_dir, unique_filename)
-                                
-                                # Copy the file
-                                import shutil
-                                shutil.copy2(image_path, destination_path)
-                                relative_path = f"/media/products/{unique_filename}"
-                            except Exception as e:
-                                errors.append(f"Row {i+1}: Error copying image file - {str(e)}")
-                        
-                        if category not in subcategories:
-                            subcategories[category] = []
-                            
-                        subcategories[category].append({
-                            "name": product_name,
-                            "subcategory": subcategory_name,
-                            "price": float(price),
-                            "description": description,
-                            "image": relative_path,
-                            "category": category,
-                            "rating": 0
-                        })
-                        success_count += 1
-                    
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"Row {i+1}: Error saving subcategory - {str(e)}")
-            
-            # Save the updated data
-            save_data(data)
-            
-            # Prepare status message
-            if error_count == 0:
-                status = {
-                    'type': 'success',
-                    'icon': 'check-circle',
-                    'message': f'Successfully imported {success_count} subcategories.'
-                }
-            else:
-                status = {
-                    'type': 'warning' if success_count > 0 else 'danger',
-                    'icon': 'exclamation-triangle',
-                    'message': f'Imported {success_count} subcategories with {error_count} errors.',
-                    'errors': errors[:10]  # Show first 10 errors only
-                }
-                
-            # Store status in session to display on page reload
-            request.session['import_status_subcategory'] = status
-            
+            job = enqueue_subcategory_import(email, csv_file, has_headers=has_headers)
+            status = {
+                'type': 'info',
+                'icon': 'spinner fa-spin',
+                'message': 'Import started. Progress is shown below.',
+                'job_id': job.pk,
+            }
         except Exception as e:
             status = {
                 'type': 'danger',
                 'icon': 'exclamation-circle',
                 'message': f'Error processing CSV file: {str(e)}'
             }
-            request.session['import_status_subcategory'] = status
+        # Store status in session to display on page reload
+        request.session['import_status_subcategory'] = status
     
     return redirect('manage_subcategory')
 
 
+@require_GET
+def import_job_status(request, job_id):
+    email = request.session.get("email")
+    if not email:
+        return JsonResponse({"error": "Not authenticated"}, status=401)
+
+    job = ImportJob.objects.filter(pk=job_id, owner_email=email).first()
+    if job is None:
+        return JsonResponse({"error": "Import job not found"}, status=404)
+    return JsonResponse(job_status(job))
+
+
+
+@require_GET
+def product_thumbnail(request, width, path):
+    """
+    Serve a resized derivative of a media image, generating it on first
+    request. Later requests find the file under MEDIA_ROOT/thumbs, where the
+    web server can serve it directly.
+    """
+    parsed = parse_thumbnail_path(f"{width}/{path}")
+    if parsed is None:
+        raise Http404("Unknown thumbnail size or format")
+    try:
+        target = generate_thumbnail(*parsed)
+    except (OSError, SuspiciousFileOperation):
+        # Missing or unreadable original
+        raise Http404("Image not found")
+    response = FileResponse(open(target, 'rb'))
+    # Names are never reused for different content
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 def update_subcategory_image(request):
     email = request.session.get("email")
     if not email:
@@ -1291,7 +1063,7 @@ def update_subcategory_image(request):
             if not category or not name:
                 return JsonResponse({"success": False, "error": "Category and name are required"})
             
-            data = load_data()
+            data = load_catalog()
             user_data_email = data['user_data'].get(email, {})
             subcategories = user_data_email.get("subcategories", {})
             
@@ -1312,28 +1084,18 @@ def update_subcategory_image(request):
             if image:
                 validate_image(image)
                 
-                # Delete old image if it's not the default
                 old_image = subcategory_to_update.get("image", "")
-                if old_image and "/default.png" not in old_image:
-                    full_path = os.path.join(settings.MEDIA_ROOT, old_image.replace("/media/", ""))
-                    if os.path.exists(full_path):
-                        os.remove(full_path)
-                
-                # Save new image
-                image_dir = os.path.join(settings.MEDIA_ROOT, "products")
-                os.makedirs(image_dir, exist_ok=True)
-                ext = os.path.splitext(image.name)[1]
-                unique_filename = f"{uuid.uuid4().hex}{ext}"
-                image_path = os.path.join(image_dir, unique_filename)
+                new_image = store_upload(image)
+                record_changes(email, [{
+                    "op": "update", "section": "subcategories", "category": category, "name": name,
+                    "fields": {"image": new_image},
+                }])
                 
-                with open(image_path, "wb+") as dest:
-                    for chunk in image.chunks():
-                        dest.write(chunk)
+                # The old image goes once nothing else uses it
+                if old_image != new_image:
+                    release_media(old_image)
                 
-                subcategory_to_update["image"] = f"/media/products/{unique_filename}"
-                save_data(data)
-                
-                return JsonResponse({"success": True, "image_url": f"/media/products/{unique_filename}"})
+                return JsonResponse({"success": True, "image_url": new_image})
             else:
                 return JsonResponse({"success": False, "error": "No image provided"})
                 
@@ -1357,6 +1119,8 @@ def get_all_products():
         subcategories = user_data.get("subcategories", {})
         for category, products in subcategories.items():
             for product in products:
+                # Entries belong to the shared catalog document; work on a copy
+                product = dict(product)
                 product["category"] = category
                 # Ensure image path is properly formatted
                 if "image" in product and not product["image"].startswith("/media/"):
@@ -1368,6 +1132,7 @@ def get_all_products():
         # Get products from products array
         products = user_data.get("products", [])
         for product in products:
+            product = dict(product)
             if "image_path" in product and not product["image_path"].startswith("/media/"):
                 product["image_path"] = f"/media/{product['image_path']}"
             elif "image_path" not in product:
@@ -1397,7 +1162,7 @@ def manage_orders(request):
     
     try:
         from customer.models import CustomerOrder
-        orders = CustomerOrder.objects.all().order_by('-order_date')
+        orders = CustomerOrder.objects.select_related('user')
         
         # Filter by status if requested
         status_filter = request.GET.get('status', '')
@@ -1412,10 +1177,8 @@ def manage_orders(request):
                 Q(user__username__icontains=search_query)
             )
         
-        # Pagination
-        paginator = Paginator(orders, 10)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Keyset pagination on (order_date, id); ?page=N still works
+        page_obj = paginate(request, orders, 'order_date')
         
         # Use the correct template path - no owner/ prefix needed
         return render(request, "orders.html", {
@@ -1480,6 +1243,7 @@ def update_order_status(request, order_id):
     if request.method == "POST":
         try:
             from customer.models import CustomerOrder
+            from customer.events import publish, user_channel
             from django.utils import timezone
             
             order = CustomerOrder.objects.get(order_id=order_id)
@@ -1490,6 +1254,11 @@ def update_order_status(request, order_id):
                 order.status = new_status
                 order.updated_at = timezone.now()
                 order.save()
+                publish(user_channel(order.user_id), 'order_status', {
+                    'order_id': order.order_id,
+                    'status': new_status,
+                    'status_display': order.get_status_display(),
+                })
                 
                 return JsonResponse({"success": True, "new_status": new_status})
             else:
@@ -1515,10 +1284,7 @@ def customer_management(request):
     if not email:
         return redirect("login")
     
-    # Get all users (customers) with their order counts
-    customers = User.objects.annotate(
-        order_count=Count('customerorder')
-    ).order_by('-date_joined')
+    customers = User.objects.all()
     
     # Filter by search query if provided
     search_query = request.GET.get('q', '')
@@ -1530,10 +1296,18 @@ def customer_management(request):
             Q(last_name__icontains=search_query)
         )
     
-    # Pagination
-    paginator = Paginator(customers, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (date_joined, id); ?page=N still works
+    page_obj = paginate(request, customers, 'date_joined')
+
+    # Order counts for this page only, in one grouped query
+    page_obj.object_list = list(page_obj.object_list)
+    from customer.models import CustomerOrder
+    order_counts = dict(
+        CustomerOrder.objects.filter(user__in=page_obj.object_list)
+        .values_list('user').annotate(n=Count('id')).order_by()
+    )
+    for customer in page_obj.object_list:
+        customer.order_count = order_counts.get(customer.id, 0)
     
     return render(request, "customer_management.html", {
         "page_obj": page_obj,
@@ -1552,7 +1326,7 @@ def customer_orders(request, customer_id):
         # Try to import CustomerOrder (handle case where customer app might not be available)
         try:
             from customer.models import CustomerOrder
-            orders = CustomerOrder.objects.filter(user=customer).order_by('-order_date')
+            orders = CustomerOrder.objects.filter(user=customer)
             
             # Filter by status if requested
             status_filter = request.GET.get('status', '')
@@ -1566,10 +1340,8 @@ def customer_orders(request, customer_id):
                     Q(order_id__icontains=search_query)
                 )
             
-            # Pagination
-            paginator = Paginator(orders, 10)
-            page_number = request.GET.get('page')
-            page_obj = paginator.get_page(page_number)
+            # Keyset pagination on (order_date, id); ?page=N still works
+            page_obj = paginate(request, orders, 'order_date')
             
             return render(request, "customer_orders.html", {
                 "customer": customer,
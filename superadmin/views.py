@@ -1,7 +1,8 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.models import User
 from django.http import JsonResponse
-from django.db.models import Count, Q
+from django.db.models import Count, Sum, Avg, Max, Min
+from django.db.models.functions import Lower
 from django.core.paginator import Paginator
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -9,20 +10,42 @@ from django.contrib import messages
 import json
 from pathlib import Path
 from django.conf import settings
+from owner.catalog import load_catalog, save_catalog, image_url
+from owner.models import Owner, Product
+from owner.search import get_search_index
 from .models import OwnerStats
 from django.db import transaction
 
 # Load owner data from JSON
-def load_owner_data():
-    DATA_FILE = Path(__file__).parent.parent / 'owner' / 'data.json'
-    if DATA_FILE.exists():
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading owner data: {e}")
-            return {"users": {}, "user_data": {}}
-    return {"users": {}, "user_data": {}}
+def load_owner_data(copy_data=False):
+    try:
+        return load_catalog(copy_data=copy_data)
+    except Exception as e:
+        print(f"Error loading owner data: {e}")
+        return {"users": {}, "user_data": {}}
+
+def product_rows(products):
+    """Shape catalog Product rows like the product dicts the templates expect"""
+    rows = []
+    for product in products:
+        rows.append({
+            'id': product.id,
+            'name': product.name,
+            'category': product.category.name if product.category else 'N/A',
+            'subcategory': product.subcategory.name if product.subcategory else 'N/A',
+            'price': float(product.price),
+            'image': image_url(product.image.name),
+            'description': product.description,
+            'owner': product.owner.username or 'Unknown Owner',
+            'owner_email': product.owner.email,
+            'type': 'subcategory' if product.subcategory_id else 'direct'
+        })
+    return rows
+
+def owner_product_rows(owner):
+    return product_rows(
+        Product.objects.filter(owner=owner).select_related('owner', 'category', 'subcategory').order_by('id')
+    )
 
 # Check if user is superuser
 def is_superuser(user):
@@ -54,38 +77,20 @@ def superadmin_logout(request):
 
 def update_owner_stats():
     """Update or create owner statistics in the database"""
-    data = load_owner_data()
-    owners_data = data.get('users', {})
-    user_data = data.get('user_data', {})
-    
+    owners = Owner.objects.annotate(
+        num_products=Count('products'),
+        inventory_value=Sum('products__price')
+    )
+
     with transaction.atomic():
-        for email, owner_info in owners_data.items():
-            # Calculate product count for this owner
-            product_count = 0
-            total_value = 0.00
-            
-            if email in user_data:
-                udata = user_data[email]
-                # Count from subcategories
-                subcategories = udata.get('subcategories', {})
-                for category, products in subcategories.items():
-                    product_count += len(products)
-                    # Calculate total value
-                    for product in products:
-                        total_value += float(product.get('price', 0))
-                # Count from products array
-                products_list = udata.get('products', [])
-                product_count += len(products_list)
-                for product in products_list:
-                    total_value += float(product.get('price', 0))
-            
+        for owner in owners:
             # Update or create the record
             OwnerStats.objects.update_or_create(
-                owner_email=email,
+                owner_email=owner.email,
                 defaults={
-                    'owner_name': owner_info.get('username', 'Unknown'),
-                    'product_count': product_count,
-                    'total_inventory_value': total_value
+                    'owner_name': owner.username or 'Unknown',
+                    'product_count': owner.num_products,
+                    'total_inventory_value': owner.inventory_value or 0
                 }
             )
 
@@ -129,57 +134,20 @@ def superadmin_dashboard(request):
 @user_passes_test(is_superuser)
 def owner_detail(request, email):
     """View details of a specific owner"""
-    # Load owner data
-    data = load_owner_data()
-    owners_data = data.get('users', {})
-    user_data = data.get('user_data', {})
-    
-    if email not in owners_data:
+    owner = Owner.objects.filter(email=email).first()
+    if owner is None:
         messages.error(request, 'Owner not found.')
         return redirect('superadmin_dashboard')
     
-    owner_info = owners_data[email]
-    
     # Get owner's products and calculate inventory value
     products = []
     total_inventory_value = 0
     categories = set()
     
-    if email in user_data:
-        udata = user_data[email]
-        
-        # Products from subcategories
-        subcategories = udata.get('subcategories', {})
-        for category, product_list in subcategories.items():
-            categories.add(category)
-            for product in product_list:
-                product_price = float(product.get('price', 0))
-                total_inventory_value += product_price
-                products.append({
-                    'name': product.get('name', 'N/A'),
-                    'category': category,
-                    'subcategory': product.get('subcategory', 'N/A'),
-                    'price': product_price,
-                    'image': product.get('image', '/media/products/default.png'),
-                    'description': product.get('description', ''),
-                    'type': 'subcategory'
-                })
-        
-        # Products from products array
-        for product in udata.get('products', []):
-            product_price = float(product.get('price', 0))
-            total_inventory_value += product_price
-            category = product.get('category', 'N/A')
-            categories.add(category)
-            products.append({
-                'name': product.get('name', 'N/A'),
-                'category': category,
-                'subcategory': product.get('subcategory', 'N/A'),
-                'price': product_price,
-                'image_path': product.get('image_path', '/media/products/default.png'),
-                'description': product.get('description', ''),
-                'type': 'direct'
-            })
+    for product in owner_product_rows(owner):
+        total_inventory_value += product['price']
+        categories.add(product['category'])
+        products.append(product)
     
     # Calculate average price
     average_price = total_inventory_value / len(products) if products else 0
@@ -188,7 +156,7 @@ def owner_detail(request, email):
     django_user = User.objects.filter(email=email).first()
     
     return render(request, 'superadmin/owner_detail.html', {
-        'owner': owner_info,
+        'owner': owner,
         'owner_email': email,
         'products': products,
         'product_count': len(products),
@@ -204,24 +172,9 @@ def owner_detail(request, email):
 @user_passes_test(is_superuser)
 def get_owner_stats(request):
     """Get owner statistics for AJAX requests"""
-    data = load_owner_data()
-    owners_data = data.get('users', {})
-    user_data = data.get('user_data', {})
-    
-    total_owners = len(owners_data)
-    
-    total_products = 0
-    for email, udata in user_data.items():
-        # Count products from subcategories
-        subcategories = udata.get('subcategories', {})
-        for category, products in subcategories.items():
-            total_products += len(products)
-        # Count products from products array
-        total_products += len(udata.get('products', []))
-    
     return JsonResponse({
-        'total_owners': total_owners,
-        'total_products': total_products
+        'total_owners': Owner.objects.count(),
+        'total_products': Product.objects.filter(owner__isnull=False).count()
     })
 
 # Delete owner account
@@ -230,7 +183,7 @@ def get_owner_stats(request):
 def delete_owner(request, email):
     """Delete an owner account from both JSON and database"""
     if request.method == "POST":
-        data = load_owner_data()
+        data = load_owner_data(copy_data=True)
         owners_data = data.get('users', {})
         user_data = data.get('user_data', {})
         
@@ -243,10 +196,8 @@ def delete_owner(request, email):
                 del user_data[email]
             
             # Save the updated data
-            DATA_FILE = Path(__file__).parent.parent / 'owner' / 'data.json'
             try:
-                with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False)
+                save_catalog(data)
                 
                 # Also remove from database
                 OwnerStats.objects.filter(owner_email=email).delete()
@@ -264,68 +215,30 @@ def delete_owner(request, email):
 @user_passes_test(is_superuser)
 def all_products(request):
     """View all products from all owners"""
-    data = load_owner_data()
-    user_data = data.get('user_data', {})
-    
-    all_products_list = []
-    
-    for email, udata in user_data.items():
-        owner_info = data.get('users', {}).get(email, {})
-        owner_name = owner_info.get('username', 'Unknown Owner')
-        
-        # Products from subcategories
-        subcategories = udata.get('subcategories', {})
-        for category, product_list in subcategories.items():
-            for product in product_list:
-                all_products_list.append({
-                    'name': product.get('name', 'N/A'),
-                    'category': category,
-                    'subcategory': product.get('subcategory', 'N/A'),
-                    'price': product.get('price', 0),
-                    'image': product.get('image', '/media/products/default.png'),
-                    'description': product.get('description', ''),
-                    'owner': owner_name,
-                    'owner_email': email,
-                    'type': 'subcategory'
-                })
-        
-        # Products from products array
-        for product in udata.get('products', []):
-            all_products_list.append({
-                'name': product.get('name', 'N/A'),
-                'category': product.get('category', 'N/A'),
-                'subcategory': product.get('subcategory', 'N/A'),
-                'price': product.get('price', 0),
-                'image_path': product.get('image_path', '/media/products/default.png'),
-                'description': product.get('description', ''),
-                'owner': owner_name,
-                'owner_email': email,
-                'type': 'direct'
-            })
+    products = Product.objects.filter(owner__isnull=False).select_related('owner', 'category', 'subcategory')
+    page_number = request.GET.get('page')
     
     # Search functionality
     search_query = request.GET.get('q', '')
     if search_query:
         search_query = search_query.lower()
-        all_products_list = [p for p in all_products_list 
-                           if search_query in p['name'].lower() 
-                           or search_query in p['category'].lower()
-                           or search_query in p['subcategory'].lower()
-                           or search_query in p['description'].lower()
-                           or search_query in p['owner'].lower()]
-    
-    # Sort by product name
-    all_products_list.sort(key=lambda x: x['name'].lower())
-    
-    # Pagination
-    paginator = Paginator(all_products_list, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        # Ranked ids from the catalog search index; only the page is loaded
+        ids = [p["id"] for p in get_search_index().search(search_query)]
+        paginator = Paginator(ids, 20)
+        page_obj = paginator.get_page(page_number)
+        rank = {pk: i for i, pk in enumerate(page_obj.object_list)}
+        page_products = sorted(products.filter(id__in=rank), key=lambda p: rank[p.id])
+    else:
+        # Sort by product name
+        paginator = Paginator(products.order_by(Lower('name'), 'id'), 20)
+        page_obj = paginator.get_page(page_number)
+        page_products = page_obj.object_list
+    page_obj.object_list = product_rows(page_products)
     
     return render(request, 'superadmin/all_products.html', {
         'page_obj': page_obj,
         'search_query': search_query,
-        'total_products': len(all_products_list)
+        'total_products': paginator.count
     })
 
 # System statistics
@@ -333,69 +246,34 @@ def all_products(request):
 @user_passes_test(is_superuser)
 def system_stats(request):
     """System-wide statistics"""
-    data = load_owner_data()
-    owners_data = data.get('users', {})
-    user_data = data.get('user_data', {})
+    products = Product.objects.filter(owner__isnull=False)
     
     # Basic stats
-    total_owners = len(owners_data)
-    
-    total_products = 0
-    total_categories = set()
-    for email, udata in user_data.items():
-        # Count products from subcategories
-        subcategories = udata.get('subcategories', {})
-        for category, products in subcategories.items():
-            total_products += len(products)
-            total_categories.add(category)
-        # Count products from products array
-        total_products += len(udata.get('products', []))
+    total_owners = Owner.objects.count()
     
     # Product price statistics
-    all_prices = []
-    for email, udata in user_data.items():
-        # Prices from subcategories
-        subcategories = udata.get('subcategories', {})
-        for category, products in subcategories.items():
-            for product in products:
-                all_prices.append(product.get('price', 0))
-        # Prices from products array
-        for product in udata.get('products', []):
-            all_prices.append(product.get('price', 0))
-    
-    if all_prices:
-        avg_price = sum(all_prices) / len(all_prices)
-        max_price = max(all_prices)
-        min_price = min(all_prices)
-    else:
-        avg_price = max_price = min_price = 0
+    price_stats = products.aggregate(
+        total=Count('id'),
+        categories=Count('category', distinct=True),
+        avg_price=Avg('price'),
+        max_price=Max('price'),
+        min_price=Min('price')
+    )
+    avg_price = float(price_stats['avg_price'] or 0)
+    max_price = price_stats['max_price'] or 0
+    min_price = price_stats['min_price'] or 0
     
     # Owner with most products
-    owner_stats = []
-    for email, owner_info in owners_data.items():
-        product_count = 0
-        if email in user_data:
-            udata = user_data[email]
-            # Count from subcategories
-            subcategories = udata.get('subcategories', {})
-            for category, products in subcategories.items():
-                product_count += len(products)
-            # Count from products array
-            product_count += len(udata.get('products', []))
-        
-        owner_stats.append({
-            'email': email,
-            'username': owner_info.get('username', 'N/A'),
-            'product_count': product_count
-        })
-    
-    owner_stats.sort(key=lambda x: x['product_count'], reverse=True)
+    owner_stats = [
+        {'email': owner.email, 'username': owner.username or 'N/A', 'product_count': owner.num_products}
+        for owner in Owner.objects.annotate(num_products=Count('products')).order_by('-num_products', 'id')
+    ]
     top_owner = owner_stats[0] if owner_stats else None
     
     return render(request, 'superadmin/system_stats.html', {
         'total_owners': total_owners,
-        'total_products': total_products,
-        'total_categories': len(total_categories),
+        'total_products': price_stats['total'],
+        'total_categories': price_stats['categories'],
         'avg_price': round(avg_price, 2),
         'max_price': max_price,
         'min_price': min_price,
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'taskpro.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from customer.sse import EVENTS_PATH, event_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Server-sent events are long-lived, so they bypass the Django request cycle
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        await event_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
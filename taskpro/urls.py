@@ -3,12 +3,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from owner.views import product_thumbnail
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('superadmin/', include('superadmin.urls')),
     path('owner/', include('owner.urls')),
     path('', include('customer.urls')),
+    # Image derivatives are made on first request, then served from MEDIA_ROOT/thumbs
+    path(f"{settings.MEDIA_URL.lstrip('/')}thumbs/<int:width>/<path:path>", product_thumbnail, name='product_thumbnail'),
 ]
 
 if settings.DEBUG: